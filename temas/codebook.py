@@ -0,0 +1,207 @@
+import os
+import pickle
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+
+
+class EntrenadorCodebook(object):
+    # Diccionario visual en streaming: los descriptores llegan por imagen y
+    # se acumulan en lotes de `tam_lote` filas que van a
+    # MiniBatchKMeans.partial_fit. En paralelo se guarda una muestra uniforme
+    # (reservorio, algoritmo R) de todo lo visto para el inicio con pocos
+    # datos y un refinado final. Lote y reservorio caben en `max_bytes`, así
+    # que la memoria no crece con el tamaño del conjunto.
+    # Con `checkpoint` el estado se guarda cada `cada` imágenes y al
+    # terminar; las imágenes ya procesadas se saltan al reanudar (conviene
+    # filtrarlas con `procesada` antes de extraer sus descriptores) y un
+    # checkpoint terminado devuelve el mismo modelo sin volver a refinarlo.
+    def __init__(self, n_clusters, tam_lote=None, max_bytes=256 * 1024 * 1024, muestras_por_imagen=None,
+                 semilla=0, checkpoint=None, cada=50, epocas_refinado=1):
+        self.n_clusters = n_clusters
+        self.tam_lote = tam_lote or max(1024, 10 * n_clusters)
+        self.max_bytes = max_bytes
+        self.muestras_por_imagen = muestras_por_imagen
+        self.semilla = semilla
+        self.checkpoint = checkpoint
+        self.cada = cada
+        self.epocas_refinado = epocas_refinado
+
+        self.rng = np.random.default_rng(semilla)
+        self.modelo = None
+        self.reservorio = None
+        self.ocupados = 0
+        self.vistos = 0
+        self.pendientes = []
+        self.filas_pendientes = 0
+        self.procesadas = set()
+        # Imágenes agregadas, con o sin clave: marca el ritmo del checkpoint
+        self.imagenes = 0
+        self.lotes = 0
+        self.terminado = False
+
+        if checkpoint and os.path.exists(checkpoint):
+            self.cargar(checkpoint)
+
+    def _nuevo_modelo(self):
+        return MiniBatchKMeans(n_clusters=self.n_clusters, batch_size=self.tam_lote,
+                               random_state=self.semilla, n_init=3)
+
+    def _capacidad(self, dims):
+        # Lo que queda de memoria tras el lote pendiente, en filas float32
+        fila = 4 * dims
+        return max(self.n_clusters, (self.max_bytes - self.tam_lote * fila) // fila)
+
+    def _muestrear(self, descriptores):
+        # Algoritmo R vectorizado: la fila t (global) entra con probabilidad
+        # capacidad / (t + 1) en una posición al azar
+        if self.reservorio is None:
+            capacidad = self._capacidad(descriptores.shape[1])
+            self.reservorio = np.empty((capacidad, descriptores.shape[1]), np.float32)
+        capacidad = len(self.reservorio)
+
+        libres = min(capacidad - self.ocupados, len(descriptores))
+        if libres > 0:
+            self.reservorio[self.ocupados:self.ocupados + libres] = descriptores[:libres]
+            self.ocupados += libres
+        resto = descriptores[libres:]
+        if len(resto):
+            t = self.vistos + libres + np.arange(len(resto))
+            posiciones = (self.rng.random(len(resto)) * (t + 1)).astype(np.int64)
+            dentro = posiciones < capacidad
+            self.reservorio[posiciones[dentro]] = resto[dentro]
+        self.vistos += len(descriptores)
+
+    def _entrenar_pendientes(self, forzar=False):
+        while self.filas_pendientes >= self.tam_lote or (forzar and self.filas_pendientes):
+            datos = np.concatenate(self.pendientes)
+            lote, sobra = datos[:self.tam_lote], datos[self.tam_lote:]
+            self.pendientes = [sobra] if len(sobra) else []
+            self.filas_pendientes = len(sobra)
+            if self.modelo is None:
+                if len(lote) < self.n_clusters:
+                    # Muy pocos datos para iniciar: se espera al refinado
+                    self.pendientes = [lote] + self.pendientes
+                    self.filas_pendientes += len(lote)
+                    return
+                self.modelo = self._nuevo_modelo()
+            self.modelo.partial_fit(lote)
+            self.lotes += 1
+
+    def procesada(self, clave):
+        return clave in self.procesadas
+
+    def agregar(self, descriptores, clave=None):
+        # Descriptores de una imagen (n, dims). Devuelve False si `clave` ya
+        # se había procesado antes del checkpoint
+        if clave is not None:
+            if clave in self.procesadas:
+                return False
+            self.procesadas.add(clave)
+        # Datos nuevos después de terminar: el modelo vuelve a refinarse
+        self.terminado = False
+        self.imagenes += 1
+        if descriptores is None or len(descriptores) == 0:
+            return True
+
+        descriptores = np.asarray(descriptores, dtype=np.float32)
+        if self.muestras_por_imagen and len(descriptores) > self.muestras_por_imagen:
+            elegidos = self.rng.choice(len(descriptores), self.muestras_por_imagen, replace=False)
+            descriptores = descriptores[np.sort(elegidos)]
+
+        self._muestrear(descriptores)
+        self.pendientes.append(descriptores)
+        self.filas_pendientes += len(descriptores)
+        self._entrenar_pendientes()
+
+        if self.checkpoint and self.imagenes % self.cada == 0:
+            self.guardar(self.checkpoint)
+        return True
+
+    def entrenar(self, fuente):
+        # `fuente` entrega (clave, descriptores) por imagen
+        for clave, descriptores in fuente:
+            self.agregar(descriptores, clave)
+        return self.terminar()
+
+    def terminar(self):
+        if self.terminado:
+            return self.modelo
+        if self.ocupados < self.n_clusters:
+            raise ValueError("Se necesitan al menos %d descriptores para el diccionario, hay %d"
+                             % (self.n_clusters, self.ocupados))
+
+        muestra = self.reservorio[:self.ocupados]
+        if self.modelo is None:
+            # Todo lo visto cabe en el reservorio: ajuste completo
+            self.modelo = self._nuevo_modelo().fit(muestra)
+            self.pendientes, self.filas_pendientes = [], 0
+        else:
+            self._entrenar_pendientes(forzar=True)
+            for _ in range(self.epocas_refinado):
+                orden = self.rng.permutation(len(muestra))
+                for inicio in range(0, len(orden), self.tam_lote):
+                    lote = muestra[orden[inicio:inicio + self.tam_lote]]
+                    if len(lote) >= self.n_clusters:
+                        self.modelo.partial_fit(lote)
+
+        self.terminado = True
+        if self.checkpoint:
+            self.guardar(self.checkpoint)
+        return self.modelo
+
+    def inercia(self):
+        # Inercia media por descriptor sobre la muestra del reservorio
+        if self.modelo is None or self.ocupados == 0:
+            return None
+        return -self.modelo.score(self.reservorio[:self.ocupados]) / self.ocupados
+
+    def estadisticas(self):
+        return {
+            "imagenes": self.imagenes,
+            "descriptores": self.vistos,
+            "lotes": self.lotes,
+            "reservorio": self.ocupados,
+            "bytes": (0 if self.reservorio is None else self.reservorio.nbytes)
+                     + sum(p.nbytes for p in self.pendientes),
+        }
+
+    def guardar(self, ruta):
+        estado = {
+            "n_clusters": self.n_clusters,
+            "tam_lote": self.tam_lote,
+            "modelo": self.modelo,
+            "reservorio": None if self.reservorio is None else self.reservorio[:self.ocupados].copy(),
+            "capacidad": None if self.reservorio is None else len(self.reservorio),
+            "vistos": self.vistos,
+            "pendientes": self.pendientes,
+            "procesadas": self.procesadas,
+            "imagenes": self.imagenes,
+            "lotes": self.lotes,
+            "rng": self.rng.bit_generator.state,
+            "terminado": self.terminado,
+        }
+        temporal = ruta + ".parcial"
+        with open(temporal, "wb") as f:
+            pickle.dump(estado, f)
+        os.replace(temporal, ruta)
+
+    def cargar(self, ruta):
+        with open(ruta, "rb") as f:
+            estado = pickle.load(f)
+        if estado["n_clusters"] != self.n_clusters or estado["tam_lote"] != self.tam_lote:
+            raise ValueError("El checkpoint %s es de otro diccionario" % ruta)
+
+        self.modelo = estado["modelo"]
+        if estado["reservorio"] is not None:
+            self.reservorio = np.empty((estado["capacidad"], estado["reservorio"].shape[1]), np.float32)
+            self.ocupados = len(estado["reservorio"])
+            self.reservorio[:self.ocupados] = estado["reservorio"]
+        self.vistos = estado["vistos"]
+        self.pendientes = estado["pendientes"]
+        self.filas_pendientes = sum(len(p) for p in self.pendientes)
+        self.procesadas = estado["procesadas"]
+        self.imagenes = estado.get("imagenes", len(self.procesadas))
+        self.lotes = estado["lotes"]
+        self.rng.bit_generator.state = estado["rng"]
+        self.terminado = estado.get("terminado", False)
@@ -0,0 +1,545 @@
+import argparse
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+import cv2
+import numpy as np
+
+from temas.videos import GrabadorVideo, LectorFrames, crear_video_sintetico, ruta_derivada
+
+
+PARAMS_LK = dict(
+    winSize=(15, 15),
+    maxLevel=3,
+    criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 15, 0.02)
+)
+
+PARAMS_ESQUINAS = dict(maxCorners=400, qualityLevel=0.25, minDistance=10, blockSize=5)
+
+_piramides_soportadas = None
+
+
+def piramides_soportadas():
+    # calcOpticalFlowPyrLK acepta en C++ pirámides ya construidas, pero los
+    # bindings de Python no las dejan pasar (el argumento es un InputArray).
+    # Solo lo usa el benchmark para informar si reutilizarlas sería posible.
+    global _piramides_soportadas
+    if _piramides_soportadas is None:
+        imagen = np.zeros((32, 32), np.uint8)
+        _, piramide = cv2.buildOpticalFlowPyramid(imagen, (15, 15), 1)
+        try:
+            cv2.calcOpticalFlowPyrLK(list(piramide), list(piramide), np.zeros((1, 1, 2), np.float32),
+                                     None, winSize=(15, 15), maxLevel=1)
+            _piramides_soportadas = True
+        except cv2.error:
+            _piramides_soportadas = False
+    return _piramides_soportadas
+
+
+class SeguidorLK(object):
+    # Trayectorias de Lucas-Kanade en un buffer circular de forma
+    # (max_trayectorias, historia, 2). Todas las trayectorias activas reciben
+    # un punto por frame, así que basta un cursor común: el punto del frame t
+    # va en la columna t % historia. `largos` cuenta los puntos válidos de
+    # cada fila (hasta `historia`) y `activos` marca las filas en uso.
+    def __init__(self, historia=7, max_trayectorias=4096, umbral_retorno=1.5, params_lk=None,
+                 params_esquinas=None, rejilla=(8, 6), objetivo=1200):
+        self.historia = historia
+        self.max_trayectorias = max_trayectorias
+        self.umbral_retorno = umbral_retorno
+        self.params_lk = PARAMS_LK if params_lk is None else params_lk
+        self.params_esquinas = PARAMS_ESQUINAS if params_esquinas is None else params_esquinas
+        # Reparto de esquinas: (columnas, filas) de la rejilla y total de
+        # trayectorias buscado; rejilla=None vuelve a una sola detección global
+        self.rejilla = rejilla
+        self.objetivo = objetivo
+
+        self.puntos = np.zeros((max_trayectorias, historia, 2), np.float32)
+        self.largos = np.zeros(max_trayectorias, np.int32)
+        self.activos = np.zeros(max_trayectorias, bool)
+        self.ids = np.full(max_trayectorias, -1, np.int64)
+        self.cursor = 0
+        self._siguiente_id = 0
+
+    def __len__(self):
+        return int(np.count_nonzero(self.activos))
+
+    def puntos_actuales(self):
+        return self.puntos[self.activos, self.cursor]
+
+    def seguir(self, gris_anterior, gris):
+        # Avanza todas las trayectorias un frame; las que no pasan la
+        # comprobación de ida y vuelta se desactivan
+        filas = np.flatnonzero(self.activos)
+        if len(filas) == 0:
+            return
+
+        pts0 = self.puntos[filas, self.cursor].reshape(-1, 1, 2)
+        pts1, _, _ = cv2.calcOpticalFlowPyrLK(gris_anterior, gris, pts0, None, **self.params_lk)
+        pts0_rev, _, _ = cv2.calcOpticalFlowPyrLK(gris, gris_anterior, pts1, None, **self.params_lk)
+
+        diferencia = np.abs(pts0 - pts0_rev).reshape(-1, 2).max(-1)
+        buenos = diferencia < self.umbral_retorno
+
+        self.activos[filas[~buenos]] = False
+        filas = filas[buenos]
+        self.cursor = (self.cursor + 1) % self.historia
+        self.puntos[filas, self.cursor] = pts1.reshape(-1, 2)[buenos]
+        self.largos[filas] = np.minimum(self.largos[filas] + 1, self.historia)
+
+    def agregar(self, puntos):
+        # Trayectorias nuevas con un solo punto; si no hay filas libres se
+        # descartan las que no caben
+        puntos = np.float32(puntos).reshape(-1, 2)
+        libres = np.flatnonzero(~self.activos)[:len(puntos)]
+        n = len(libres)
+        self.puntos[libres, self.cursor] = puntos[:n]
+        self.largos[libres] = 1
+        self.activos[libres] = True
+        self.ids[libres] = np.arange(self._siguiente_id, self._siguiente_id + n)
+        self._siguiente_id += n
+        return n
+
+    def _celdas(self, puntos, forma):
+        # Celda de la rejilla de cada punto, en el mismo reparto que
+        # cv2.resize(INTER_NEAREST) usa para agrandar la máscara de celdas
+        columnas, filas = self.rejilla
+        alto, ancho = forma
+        cx = np.clip((puntos[:, 0] * (columnas / float(ancho))).astype(np.int64), 0, columnas - 1)
+        cy = np.clip((puntos[:, 1] * (filas / float(alto))).astype(np.int64), 0, filas - 1)
+        return cy * columnas + cx
+
+    def detectar(self, gris, radio=8):
+        # Nuevas esquinas lejos de las trayectorias actuales
+        if self.rejilla is None:
+            mascara = np.full_like(gris, 255)
+            for x, y in np.int32(self.puntos_actuales()):
+                cv2.circle(mascara, (int(x), int(y)), radio, 0, -1)
+
+            caracteristicas = cv2.goodFeaturesToTrack(gris, mask=mascara, **self.params_esquinas)
+            if caracteristicas is None:
+                return 0
+            return self.agregar(caracteristicas)
+
+        # Con rejilla: cada celda admite hasta objetivo / celdas trayectorias y
+        # solo se buscan esquinas en las que tienen lugar
+        columnas, filas = self.rejilla
+        actuales = self.puntos_actuales()
+        conteo = np.bincount(self._celdas(actuales, gris.shape), minlength=columnas * filas)
+        cupo = -(-self.objetivo // (columnas * filas))
+        faltan = np.maximum(cupo - conteo, 0)
+        limite = min(int(faltan.sum()), self.params_esquinas["maxCorners"],
+                     self.max_trayectorias - len(actuales))
+        if limite <= 0:
+            return 0
+
+        libres = np.where(faltan > 0, 255, 0).astype(np.uint8).reshape(filas, columnas)
+        mascara = cv2.resize(libres, (gris.shape[1], gris.shape[0]), interpolation=cv2.INTER_NEAREST)
+        if len(actuales):
+            # Discos alrededor de las trayectorias en una sola llamada
+            puntas = np.repeat(np.int32(actuales)[:, None], 2, axis=1)
+            cv2.polylines(mascara, puntas, False, 0, 2 * radio)
+
+        # Se piden más candidatas de las necesarias porque suelen juntarse en
+        # las celdas con más textura
+        params = dict(self.params_esquinas, maxCorners=4 * limite)
+        caracteristicas = cv2.goodFeaturesToTrack(gris, mask=mascara, **params)
+        if caracteristicas is None:
+            return 0
+
+        # Las esquinas vienen ordenadas por calidad: dentro de cada celda se
+        # quedan las primeras `faltan` y en total las `limite` mejores
+        caracteristicas = caracteristicas.reshape(-1, 2)
+        celdas = self._celdas(caracteristicas, gris.shape)
+        orden = np.argsort(celdas, kind="stable")
+        agrupadas = celdas[orden]
+        rango = np.arange(len(orden)) - np.searchsorted(agrupadas, agrupadas)
+        elegidas = np.sort(orden[rango < faltan[agrupadas]])[:limite]
+        return self.agregar(caracteristicas[elegidas])
+
+    def rutas(self, filas=None):
+        # (n, historia, 2) de la más vieja a la más nueva. Las trayectorias
+        # más cortas repiten su primer punto, así todas tienen el mismo largo
+        # y se pueden dibujar o analizar como un solo array
+        if filas is None:
+            filas = np.flatnonzero(self.activos)
+        orden = (self.cursor + 1 + np.arange(self.historia)) % self.historia
+        primero = self.historia - self.largos[filas]
+        columnas = np.maximum(np.arange(self.historia)[None, :], primero[:, None])
+        return self.puntos[filas[:, None], orden[columnas]]
+
+    def exportar(self):
+        # (ids, trayectorias) con NaN donde la trayectoria aún no tenía puntos
+        filas = np.flatnonzero(self.activos)
+        rutas = self.rutas(filas)
+        vacios = np.arange(self.historia)[None, :] < (self.historia - self.largos[filas])[:, None]
+        rutas[vacios] = np.nan
+        return self.ids[filas].copy(), rutas
+
+    def dibujar(self, salida, color_ruta=(0, 255, 255), color_punto=(255, 0, 0)):
+        # Solo las trayectorias con al menos dos puntos (las recién detectadas
+        # se ven a partir del frame siguiente)
+        filas = np.flatnonzero(self.activos & (self.largos > 1))
+        if len(filas) == 0:
+            return salida
+        rutas = self.rutas(filas).astype(np.int32)
+        # Puntos actuales como segmentos de largo cero con trazo grueso
+        puntas = np.repeat(rutas[:, -1:], 2, axis=1)
+        cv2.polylines(salida, puntas, False, color_punto, 8)
+        cv2.polylines(salida, rutas, False, color_ruta, 2)
+        return salida
+
+
+# Flujo denso: un vector por píxel. DIS con sus presets o Farnebäck.
+METODOS_DENSOS = {
+    "dis_ultrarrapido": "DIS (ultrarrápido)",
+    "dis_rapido": "DIS (rápido)",
+    "dis_medio": "DIS (medio)",
+    "farneback": "Farnebäck",
+}
+
+_PRESETS_DIS = {
+    "dis_ultrarrapido": cv2.DISOPTICAL_FLOW_PRESET_ULTRAFAST,
+    "dis_rapido": cv2.DISOPTICAL_FLOW_PRESET_FAST,
+    "dis_medio": cv2.DISOPTICAL_FLOW_PRESET_MEDIUM,
+}
+
+PARAMS_FARNEBACK = dict(pyr_scale=0.5, levels=3, winsize=15, iterations=3, poly_n=5,
+                        poly_sigma=1.2, flags=0)
+
+
+class FlujoDenso(object):
+    # Con `inicial` el flujo del frame anterior se pasa como estimación
+    # inicial al siguiente (DIS lo usa si viene del tamaño correcto,
+    # Farnebäck con OPTFLOW_USE_INITIAL_FLOW). Los buffers de visualización
+    # se reservan una sola vez.
+    def __init__(self, metodo="dis_rapido", inicial=False):
+        if metodo not in METODOS_DENSOS:
+            raise ValueError("Método desconocido: " + str(metodo))
+        self.metodo = metodo
+        self.inicial = inicial
+        self.flujo = None
+        self._dis = None
+        if metodo in _PRESETS_DIS:
+            self._dis = cv2.DISOpticalFlow_create(_PRESETS_DIS[metodo])
+            self._dis.setUseSpatialPropagation(True)
+        self._hsv = None
+
+    def calcular(self, gris_anterior, gris):
+        previo = self.flujo if self.inicial and self.flujo is not None else None
+        if self._dis is not None:
+            self.flujo = self._dis.calc(gris_anterior, gris, previo)
+        else:
+            params = dict(PARAMS_FARNEBACK)
+            if previo is not None:
+                params["flags"] |= cv2.OPTFLOW_USE_INITIAL_FLOW
+            self.flujo = cv2.calcOpticalFlowFarneback(gris_anterior, gris, previo, **params)
+        return self.flujo
+
+    def visualizar(self, flujo=None, maximo=None):
+        # Dirección -> tono, magnitud -> brillo. `maximo` fija la magnitud
+        # que satura el brillo; sin él se normaliza por frame
+        flujo = self.flujo if flujo is None else flujo
+        if self._hsv is None or self._hsv.shape[:2] != flujo.shape[:2]:
+            self._hsv = np.empty(flujo.shape[:2] + (3,), np.uint8)
+            self._hsv[..., 1] = 255
+        magnitud, angulo = cv2.cartToPolar(flujo[..., 0], flujo[..., 1], angleInDegrees=True)
+        self._hsv[..., 0] = angulo * 0.5
+        if maximo is None:
+            cv2.normalize(magnitud, magnitud, 0, 255, cv2.NORM_MINMAX)
+        else:
+            cv2.multiply(magnitud, 255.0 / maximo, magnitud)
+        self._hsv[..., 2] = cv2.convertScaleAbs(magnitud)
+        return cv2.cvtColor(self._hsv, cv2.COLOR_HSV2BGR)
+
+
+def resumen_regiones(flujo, rejilla=(4, 3)):
+    # Por celda: vector medio (dx, dy) y magnitud media. cv2.resize con
+    # INTER_AREA promedia cada celda sin recorrerlas
+    columnas, filas = rejilla
+    medio = cv2.resize(flujo, (columnas, filas), interpolation=cv2.INTER_AREA)
+    magnitud = cv2.magnitude(flujo[..., 0], flujo[..., 1])
+    magnitud = cv2.resize(magnitud, (columnas, filas), interpolation=cv2.INTER_AREA)
+    return medio, magnitud
+
+
+def dibujar_resumen(salida, medio, magnitud, color=(255, 255, 255), escala_flecha=4.0):
+    filas, columnas = magnitud.shape
+    alto, ancho = salida.shape[:2]
+    for fila in range(filas):
+        for columna in range(columnas):
+            cx = int((columna + 0.5) * ancho / columnas)
+            cy = int((fila + 0.5) * alto / filas)
+            dx, dy = medio[fila, columna] * escala_flecha
+            cv2.arrowedLine(salida, (cx, cy), (int(cx + dx), int(cy + dy)), color, 2, tipLength=0.3)
+            cv2.putText(salida, "%.1f" % magnitud[fila, columna], (cx - 15, cy + 20),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.45, color, 1)
+    return salida
+
+
+def medir_denso(ruta, escalas=(0.2, 0.4, 0.6, 1.0), frames=30):
+    # ms por frame de cada método (cálculo y visualización por separado)
+    resultados = {}
+    for escala in escalas:
+        grises = [gris for _, _, gris in LectorFrames(ruta, 0, frames, escala=escala,
+                                                      interpolacion=cv2.INTER_AREA)]
+        for metodo in METODOS_DENSOS:
+            denso = FlujoDenso(metodo)
+            calculo, visual = 0.0, 0.0
+            for anterior, gris in zip(grises, grises[1:]):
+                inicio = time.perf_counter()
+                denso.calcular(anterior, gris)
+                medio = time.perf_counter()
+                denso.visualizar()
+                calculo += medio - inicio
+                visual += time.perf_counter() - medio
+            n = max(1, len(grises) - 1)
+            resultados[(escala, metodo)] = (1e3 * calculo / n, 1e3 * visual / n)
+    return resultados
+
+
+class TrabajoFlujo(object):
+    # Procesamiento completo de tema8 (LK o flujo denso) en un hilo propio,
+    # pensado para guardarse en st.session_state: sigue corriendo entre
+    # reruns, expone el progreso y la salida parcial (miniaturas) y se puede
+    # cancelar y reanudar, porque el seguidor, el grabador abierto y el
+    # índice del próximo frame quedan en el objeto. `clave` identifica los
+    # parámetros que cambian la salida.
+    def __init__(self, almacen, clave, modo="lk", escala=0.4, limite_frames=80, historia=7,
+                 salto=3, objetivo=1200, maximo=None, mostrar_regiones=True):
+        self.almacen = almacen
+        self.clave = clave
+        self.modo = modo
+        self.escala = escala
+        self.limite_frames = limite_frames
+        self.salto = salto
+        self.maximo = maximo
+        self.mostrar_regiones = mostrar_regiones
+
+        if modo == "lk":
+            self.seguidor = SeguidorLK(historia=historia, objetivo=objetivo)
+            self.denso = None
+        else:
+            self.seguidor = None
+            self.denso = FlujoDenso(modo)
+            self.suma_regiones = np.zeros((3, 4), np.float64)
+
+        # La salida se escribe al MP4 frame a frame, en memoria solo quedan
+        # las miniaturas
+        ruta = ruta_derivada(almacen.hash, "flujo-%s.mp4" % uuid.uuid4().hex[:12])
+        self.grabador = GrabadorVideo(ruta, almacen.fps)
+        self.tiempos = []
+        self.siguiente = 0
+        self.terminado = False
+        self.error = None
+        self._gris_anterior = None
+        self._detener = threading.Event()
+        self._hilo = None
+
+    @property
+    def en_curso(self):
+        return self._hilo is not None and self._hilo.is_alive()
+
+    @property
+    def progreso(self):
+        return min(1.0, self.siguiente / float(max(1, self.limite_frames)))
+
+    def iniciar(self):
+        if self.terminado or self.en_curso:
+            return self
+        self._detener.clear()
+        self.error = None
+        self._hilo = threading.Thread(target=self._ejecutar, daemon=True)
+        self._hilo.start()
+        return self
+
+    def cancelar(self, esperar=True):
+        self._detener.set()
+        if esperar and self._hilo is not None:
+            self._hilo.join()
+
+    def descartar(self):
+        self.cancelar()
+        self.grabador.descartar()
+
+    def _ejecutar(self):
+        try:
+            lector = LectorFrames(self.almacen, self.siguiente, self.limite_frames, escala=self.escala,
+                                  interpolacion=cv2.INTER_AREA)
+            for _, cuadro, gris in lector:
+                if self._detener.is_set():
+                    return
+                self._procesar(cuadro, gris)
+            self.grabador.cerrar()
+            self.terminado = True
+        except Exception as error:
+            self.error = error
+
+    def _procesar(self, cuadro, gris):
+        # Con escala 1 el frame es el del almacén (solo lectura)
+        salida = cuadro if cuadro.flags.writeable else cuadro.copy()
+        inicio = time.perf_counter()
+
+        if self.seguidor is not None:
+            if self._gris_anterior is not None:
+                self.seguidor.seguir(self._gris_anterior, gris)
+                self.seguidor.dibujar(salida)
+            if self.siguiente % self.salto == 0:
+                self.seguidor.detectar(gris)
+            info = "T: %d" % len(self.seguidor)
+        elif self._gris_anterior is not None:
+            # Campo de flujo en HSV en lugar del frame
+            flujo = self.denso.calcular(self._gris_anterior, gris)
+            salida = self.denso.visualizar(maximo=self.maximo)
+            medio, magnitud = resumen_regiones(flujo)
+            self.suma_regiones += magnitud
+            if self.mostrar_regiones:
+                dibujar_resumen(salida, medio, magnitud)
+            info = "|v|: %.2f px" % cv2.mean(magnitud)[0]
+        else:
+            info = "|v|: -"
+
+        self.tiempos.append(1e3 * (time.perf_counter() - inicio))
+
+        # Info en frame
+        cv2.putText(salida, "F: %d" % (self.siguiente + 1), (15, 35),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+        cv2.putText(salida, info, (15, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+
+        self.grabador.escribir(salida)
+        self._gris_anterior = gris
+        self.siguiente += 1
+
+    def regiones(self):
+        if self.denso is None:
+            return None
+        return self.suma_regiones / max(1, self.siguiente - 1)
+
+    def exportar(self):
+        # Trayectorias activas; solo con el hilo detenido
+        if self.seguidor is None or self.en_curso:
+            return None
+        return self.seguidor.exportar()
+
+
+def medir_seguimiento(ruta, escalas=(0.2, 0.4, 0.6, 1.0), frames=60, salto=3, historia=7):
+    # ms por frame del paso de seguimiento (LK de ida y vuelta) para cada
+    # escala y lo que cuesta construir una pirámide: cada frame construye
+    # cuatro (dos por llamada), así que reutilizarlas ahorraría unas tres
+    resultados = {}
+    for escala in escalas:
+        grises = [gris for _, _, gris in LectorFrames(ruta, 0, frames, escala=escala,
+                                                      interpolacion=cv2.INTER_AREA)]
+        seguidor = SeguidorLK(historia)
+        tiempo, puntos = 0.0, 0
+        for i, gris in enumerate(grises):
+            if i > 0:
+                puntos += len(seguidor)
+                inicio = time.perf_counter()
+                seguidor.seguir(grises[i - 1], gris)
+                tiempo += time.perf_counter() - inicio
+            if i % salto == 0:
+                seguidor.detectar(gris)
+        fila = {"lk": 1e3 * tiempo / max(1, len(grises) - 1), "puntos": puntos / max(1, len(grises) - 1)}
+
+        inicio = time.perf_counter()
+        for gris in grises:
+            cv2.buildOpticalFlowPyramid(gris, PARAMS_LK["winSize"], PARAMS_LK["maxLevel"])
+        fila["piramide"] = 1e3 * (time.perf_counter() - inicio) / len(grises)
+        resultados[escala] = fila
+    return resultados
+
+
+def medir_deteccion(ruta, escala=0.4, frames=60, salto=3, historia=7, max_esquinas=400,
+                    rejilla=(8, 6), objetivo=1200):
+    # Detección global (máscara con un círculo por trayectoria) contra el
+    # reparto por rejilla: costo por frame de detección, esquinas nuevas,
+    # cuántas se pierden antes de 3 frames, estabilidad del número de
+    # trayectorias y fracción de celdas de la rejilla con alguna trayectoria
+    grises = [gris for _, _, gris in LectorFrames(ruta, 0, frames, escala=escala,
+                                                  interpolacion=cv2.INTER_AREA)]
+    params = dict(PARAMS_ESQUINAS, maxCorners=max_esquinas)
+    columnas, filas = rejilla
+    resultados = {}
+    for nombre, modo in (("global", None), ("rejilla", rejilla)):
+        seguidor = SeguidorLK(historia, params_esquinas=params, rejilla=modo, objetivo=objetivo)
+        tiempo, detecciones, nuevas, cortas, conteos, cobertura = 0.0, 0, 0, 0, [], []
+        for i, gris in enumerate(grises):
+            if i > 0:
+                antes = seguidor.activos.copy()
+                seguidor.seguir(grises[i - 1], gris)
+                perdidas = antes & ~seguidor.activos
+                cortas += int(np.count_nonzero(seguidor.largos[perdidas] < 3))
+            if i % salto == 0:
+                inicio = time.perf_counter()
+                nuevas += seguidor.detectar(gris)
+                tiempo += time.perf_counter() - inicio
+                detecciones += 1
+            conteos.append(len(seguidor))
+            # La cobertura siempre se mide sobre la misma rejilla
+            seguidor_rejilla = seguidor.rejilla
+            seguidor.rejilla = rejilla
+            celdas = seguidor._celdas(seguidor.puntos_actuales(), gris.shape)
+            seguidor.rejilla = seguidor_rejilla
+            cobertura.append(len(np.unique(celdas)) / float(columnas * filas))
+        resultados[nombre] = {
+            "ms_deteccion": 1e3 * tiempo / detecciones,
+            "nuevas_por_deteccion": nuevas / float(detecciones),
+            "perdidas_cortas": cortas / float(max(1, nuevas)),
+            "trayectorias": float(np.mean(conteos[salto:])),
+            "desviacion": float(np.std(conteos[salto:])),
+            "cobertura": float(np.mean(cobertura)),
+        }
+    return resultados
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description='Benchmark of the LK tracking step per scale')
+    parser.add_argument("--input-video", dest="input_video", required=False,
+                        help="Video to track (a synthetic one is generated if omitted)")
+    parser.add_argument("--frames", dest="frames", type=int, default=60,
+                        help="Frames to process per scale")
+    parser.add_argument("--scales", dest="scales", type=float, nargs="+", default=[0.2, 0.4, 0.6, 1.0],
+                        help="Scales to measure")
+    parser.add_argument("--detection", dest="detection", action="store_true",
+                        help="Compare global vs grid feature replenishment instead")
+    parser.add_argument("--max-corners", dest="max_corners", type=int, default=400,
+                        help="Corners per detection for --detection")
+    parser.add_argument("--dense", dest="dense", action="store_true",
+                        help="Time the dense flow methods instead")
+    return parser
+
+
+if __name__ == '__main__':
+    args = build_arg_parser().parse_args()
+    ruta = args.input_video
+    if ruta is None:
+        ruta = crear_video_sintetico(os.path.join(tempfile.gettempdir(), "sintetico.mp4"), args.frames)
+    if args.dense:
+        for (escala, metodo), (calculo, visual) in medir_denso(ruta, args.scales, args.frames).items():
+            print("Scale %.1f %-16s flow %7.2f ms/frame, visualization %5.2f ms/frame" % (
+                escala, metodo, calculo, visual))
+        raise SystemExit
+
+    if args.detection:
+        for escala in args.scales:
+            for nombre, fila in medir_deteccion(ruta, escala, args.frames,
+                                                max_esquinas=args.max_corners).items():
+                print("Scale %.1f %-8s %.2f ms/detection, %5.0f new/detection, %4.1f%% lost within "
+                      "3 frames, %6.0f +- %4.0f tracks, %3.0f%% cells covered" % (
+                          escala, nombre, fila["ms_deteccion"], fila["nuevas_por_deteccion"],
+                          100 * fila["perdidas_cortas"], fila["trayectorias"], fila["desviacion"],
+                          100 * fila["cobertura"]))
+        raise SystemExit
+
+    if piramides_soportadas():
+        print("These OpenCV bindings accept prebuilt pyramids; reusing them in SeguidorLK is possible")
+    else:
+        print("These OpenCV bindings do not accept prebuilt pyramids; SeguidorLK passes plain images")
+    for escala, fila in medir_seguimiento(ruta, args.scales, args.frames).items():
+        print("Scale %.1f: %6.0f tracks, LK %.2f ms/frame, pyramid build %.2f ms "
+              "(reuse would save ~%.2f ms/frame)" % (escala, fila["puntos"], fila["lk"],
+                                                     fila["piramide"], 3 * fila["piramide"]))
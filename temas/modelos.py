@@ -0,0 +1,139 @@
+import hashlib
+import os
+import pickle
+import sys
+import threading
+import time
+
+import numpy as np
+
+
+# Registro de modelos compartido por todo el proceso: cada conjunto de
+# archivos se carga una sola vez y lo usan todas las sesiones. Se revisa la
+# firma (mtime, tamaño) de los archivos en cada pedido; si cambió se calcula
+# el hash del contenido y solo se recarga si el contenido es distinto.
+def hash_archivo(ruta, bloque=1024 * 1024):
+    digest = hashlib.sha1()
+    with open(ruta, "rb") as f:
+        for parte in iter(lambda: f.read(bloque), b""):
+            digest.update(parte)
+    return digest.hexdigest()
+
+
+def _firma(ruta):
+    estado = os.stat(ruta)
+    return estado.st_mtime_ns, estado.st_size
+
+
+def memoria_aproximada(objeto, vistos=None):
+    # Bytes de los arrays de numpy y objetos de Python alcanzables desde
+    # `objeto`. Los objetos nativos opacos (p. ej. cv2.ml) solo cuentan su
+    # envoltorio, por eso también se informa el tamaño de los archivos.
+    if vistos is None:
+        vistos = set()
+    if id(objeto) in vistos:
+        return 0
+    vistos.add(id(objeto))
+
+    if isinstance(objeto, np.ndarray):
+        return objeto.nbytes + (memoria_aproximada(objeto.base, vistos) if objeto.base is not None else 0)
+    total = sys.getsizeof(objeto)
+    if isinstance(objeto, dict):
+        total += sum(memoria_aproximada(k, vistos) + memoria_aproximada(v, vistos) for k, v in objeto.items())
+    elif isinstance(objeto, (list, tuple, set, frozenset)):
+        total += sum(memoria_aproximada(x, vistos) for x in objeto)
+    elif hasattr(objeto, "__dict__"):
+        total += memoria_aproximada(vars(objeto), vistos)
+    return total
+
+
+def cargar_pickle(ruta):
+    with open(ruta, "rb") as f:
+        return pickle.load(f)
+
+
+class _Entrada(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.modelo = None
+        self.firmas = None
+        self.hashes = None
+        self.segundos = 0.0
+        self.memoria = 0
+        self.cargas = 0
+        self.aciertos = 0
+
+
+class RegistroModelos(object):
+    def __init__(self):
+        self._entradas = {}
+        self._lock = threading.Lock()
+
+    def _entrada(self, clave):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                entrada = self._entradas[clave] = _Entrada()
+            return entrada
+
+    def obtener(self, rutas, cargar, nombre=None):
+        # `cargar(*rutas)` construye el modelo; se llama solo la primera vez
+        # y cuando cambia el contenido de alguno de los archivos
+        rutas = tuple(os.path.abspath(r) for r in rutas)
+        entrada = self._entrada((nombre or getattr(cargar, "__name__", "modelo"), rutas))
+
+        # El lock de la entrada hace que sesiones concurrentes esperen a una
+        # única carga en lugar de repetirla
+        with entrada.lock:
+            firmas = tuple(_firma(r) for r in rutas)
+            if entrada.modelo is not None and firmas == entrada.firmas:
+                entrada.aciertos += 1
+                return entrada.modelo
+
+            hashes = tuple(hash_archivo(r) for r in rutas)
+            if entrada.modelo is not None and hashes == entrada.hashes:
+                # Solo cambió la fecha (copia, touch): se conserva el modelo
+                entrada.firmas = firmas
+                entrada.aciertos += 1
+                return entrada.modelo
+
+            inicio = time.perf_counter()
+            modelo = cargar(*rutas)
+            entrada.segundos = time.perf_counter() - inicio
+            entrada.modelo = modelo
+            entrada.firmas = firmas
+            entrada.hashes = hashes
+            entrada.memoria = memoria_aproximada(modelo)
+            entrada.cargas += 1
+            return modelo
+
+    def estadisticas(self):
+        with self._lock:
+            entradas = list(self._entradas.items())
+        filas = []
+        for (nombre, rutas), entrada in entradas:
+            if entrada.modelo is None:
+                continue
+            filas.append({
+                "modelo": nombre,
+                "archivos": ", ".join(os.path.basename(r) for r in rutas),
+                "hash": ",".join(h[:10] for h in entrada.hashes),
+                "carga_ms": round(1e3 * entrada.segundos, 1),
+                "memoria_kb": round(entrada.memoria / 1024.0, 1),
+                "archivos_kb": round(sum(f[1] for f in entrada.firmas) / 1024.0, 1),
+                "cargas": entrada.cargas,
+                "aciertos": entrada.aciertos,
+            })
+        return filas
+
+    def olvidar(self, nombre=None):
+        with self._lock:
+            if nombre is None:
+                self._entradas.clear()
+            else:
+                for clave in [c for c in self._entradas if c[0] == nombre]:
+                    del self._entradas[clave]
+
+
+# Registro compartido por todo el proceso
+registro_modelos = RegistroModelos()
@@ -0,0 +1,419 @@
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+from temas.videos import AlmacenFrames, LectorFrames, ruta_derivada
+
+
+MODELOS = {
+    "diferencia": "Diferencia entre frames",
+    "promedio": "Promedio acumulado",
+    "mog2": "MOG2",
+    "knn": "KNN",
+}
+
+
+# Umbral de diferencia por defecto; los sustractores lo usan de referencia
+UMBRAL_BASE = 25
+
+
+class DetectorMovimiento(object):
+    # Motor de detección de movimiento con modelos intercambiables. Trabaja
+    # sobre una versión reducida del gris (`escala_trabajo`) con buffers
+    # reservados una sola vez, y devuelve las cajas ya reescaladas a la
+    # resolución de entrada.
+    def __init__(self, modelo="diferencia", umbral=25, area_minima=700, escala_trabajo=1.0,
+                 alfa=0.05, dilatacion=7):
+        if modelo not in MODELOS:
+            raise ValueError("Modelo desconocido: " + str(modelo))
+        self.modelo = modelo
+        self.umbral = umbral
+        self.area_minima = area_minima
+        self.escala_trabajo = escala_trabajo
+        self.alfa = alfa
+        self.elemento = np.ones((dilatacion, dilatacion), np.uint8)
+        self.frames = 0
+
+        self._tamano = None
+        self._actual = None
+        self._previo = None
+        self._fondo = None
+        self._fondo_u8 = None
+        self._diferencia = None
+        self._binario = None
+        self._dilatado = None
+
+        # Los sustractores comparan distancias al cuadrado, así que el umbral
+        # se escala al cuadrado; con el umbral por defecto (25) quedan sus
+        # valores por defecto (varThreshold 16, dist2Threshold 400)
+        self._sustractor = None
+        relativo = (umbral / float(UMBRAL_BASE)) ** 2
+        if modelo == "mog2":
+            self._sustractor = cv2.createBackgroundSubtractorMOG2(varThreshold=16 * relativo,
+                                                                  detectShadows=False)
+        elif modelo == "knn":
+            self._sustractor = cv2.createBackgroundSubtractorKNN(dist2Threshold=400 * relativo,
+                                                                 detectShadows=False)
+
+    def _reservar(self, gris):
+        alto, ancho = gris.shape[:2]
+        ancho_t = max(1, int(round(ancho * self.escala_trabajo)))
+        alto_t = max(1, int(round(alto * self.escala_trabajo)))
+        self._tamano = (ancho, alto)
+        self._escala_x = ancho / float(ancho_t)
+        self._escala_y = alto / float(alto_t)
+        forma = (alto_t, ancho_t)
+        self._actual = np.empty(forma, np.uint8)
+        self._previo = np.empty(forma, np.uint8)
+        self._diferencia = np.empty(forma, np.uint8)
+        self._binario = np.empty(forma, np.uint8)
+        self._dilatado = np.empty(forma, np.uint8)
+        if self.modelo == "promedio":
+            self._fondo = np.empty(forma, np.float32)
+            self._fondo_u8 = np.empty(forma, np.uint8)
+
+    def _reducir(self, gris):
+        if self._actual.shape == gris.shape:
+            np.copyto(self._actual, gris)
+        else:
+            cv2.resize(gris, (self._actual.shape[1], self._actual.shape[0]), dst=self._actual,
+                       interpolation=cv2.INTER_AREA)
+
+    def mascara(self, gris):
+        # Máscara binaria de movimiento en resolución de trabajo, o None en
+        # el primer frame de los modelos que necesitan una referencia
+        if self._tamano != (gris.shape[1], gris.shape[0]):
+            self._reservar(gris)
+            self.frames = 0
+        self._reducir(gris)
+        self.frames += 1
+
+        if self._sustractor is not None:
+            self._sustractor.apply(self._actual, self._binario)
+            return self._binario
+
+        if self.modelo == "diferencia":
+            if self.frames == 1:
+                self._previo, self._actual = self._actual, self._previo
+                return None
+            cv2.absdiff(self._previo, self._actual, dst=self._diferencia)
+            # El frame actual pasa a ser el previo sin copiarlo
+            self._previo, self._actual = self._actual, self._previo
+        else:
+            if self.frames == 1:
+                self._fondo[:] = self._actual
+                return None
+            cv2.convertScaleAbs(self._fondo, dst=self._fondo_u8)
+            cv2.absdiff(self._fondo_u8, self._actual, dst=self._diferencia)
+            cv2.accumulateWeighted(self._actual, self._fondo, self.alfa)
+
+        cv2.threshold(self._diferencia, self.umbral, 255, cv2.THRESH_BINARY, dst=self._binario)
+        return self._binario
+
+    def procesar(self, gris):
+        # Cajas (x, y, w, h) en coordenadas de `gris` de las regiones en
+        # movimiento con área mayor que `area_minima` (medida a tamaño completo)
+        binario = self.mascara(gris)
+        if binario is None:
+            return []
+
+        cv2.dilate(binario, self.elemento, dst=self._dilatado, iterations=1)
+        contornos, _ = cv2.findContours(self._dilatado, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        area_minima = self.area_minima / (self._escala_x * self._escala_y)
+        cajas = []
+        for cnt in contornos:
+            if cv2.contourArea(cnt) > area_minima:
+                x, y, w, h = cv2.boundingRect(cnt)
+                cajas.append((int(x * self._escala_x), int(y * self._escala_y),
+                              int(round(w * self._escala_x)), int(round(h * self._escala_y))))
+        return cajas
+
+
+def analizar_frames(fuente, umbral=25, area_minima=700, max_frames=None, paso=1,
+                    modelo="diferencia", escala_trabajo=1.0, segmentos=None, tamano=(640, 480)):
+    # Bucle de detección sin interfaz: entrega (índice, frame, cajas) por cada
+    # frame analizado. Sin `segmentos` recorre el video desde el inicio; con
+    # ellos, cada tramo [inicio, fin) usa un detector nuevo.
+    if segmentos is None:
+        fin = None if max_frames is None else 1 + max_frames * paso
+        segmentos = [(0, fin)]
+
+    contador = 0
+    for inicio, fin in segmentos:
+        if max_frames is not None and contador >= max_frames:
+            return
+
+        # Cada tramo arranca un frame antes para tener referencia
+        detector = DetectorMovimiento(modelo, umbral, area_minima, escala_trabajo)
+        inicio = max(0, int(inicio) - paso)
+        if fin is not None:
+            fin = int(fin)
+        if max_frames is not None:
+            limite = inicio + 1 + (max_frames - contador) * paso
+            fin = limite if fin is None else min(fin, limite)
+
+        # Decodificación, escalado y gris en un hilo aparte
+        for idx, cuadro, gris in LectorFrames(fuente, inicio, fin, paso, tamano=tamano):
+            cajas = detector.procesar(gris)
+            if detector.frames == 1:
+                # El primer frame solo inicializa el modelo
+                continue
+            contador += 1
+            yield idx, cuadro, cajas
+
+
+def anotar_cuadro(cuadro, cajas):
+    # Marcar objetos
+    hay_movimiento = len(cajas) > 0
+    for x, y, w, h in cajas:
+        cv2.rectangle(cuadro, (x, y), (x + w, y + h), (255, 0, 0), 3)
+
+    # Texto de estado
+    texto = "MOVIMIENTO" if hay_movimiento else "QUIETO"
+    color = (0, 255, 0) if hay_movimiento else (200, 200, 0)
+    cv2.putText(cuadro, texto, (25, 50), cv2.FONT_HERSHEY_SIMPLEX, 1.0, color, 3)
+    return cuadro
+
+
+# Índice de actividad: una pasada a baja resolución que guarda, por frame,
+# la fracción de píxeles que cambiaron. Se persiste como .npy (float16)
+# junto al hash del video, así reabrir el mismo video no lo recorre otra vez.
+def calcular_puntajes(fuente, tamano=(160, 120), umbral=25, paso=1, total=None, progreso=None):
+    if total is None and isinstance(fuente, AlmacenFrames):
+        total = fuente.total
+    detector = DetectorMovimiento("diferencia", umbral)
+    puntajes = []
+    for idx, _, gris in LectorFrames(fuente, paso=paso, tamano=tamano, interpolacion=cv2.INTER_AREA):
+        binario = detector.mascara(gris)
+        puntaje = 0.0 if binario is None else cv2.countNonZero(binario) / float(binario.size)
+        # Los frames saltados heredan el puntaje del último analizado
+        puntajes.extend([puntaje] * paso)
+        if progreso is not None and total:
+            progreso(min(1.0, (idx + 1) / float(total)))
+    if total:
+        puntajes = puntajes[:total]
+    return np.asarray(puntajes, dtype=np.float16)
+
+
+def indice_movimiento(almacen, tamano=(160, 120), umbral=25, paso=1, progreso=None):
+    nombre = "movimiento-%dx%d-u%d-p%d.npy" % (tamano[0], tamano[1], umbral, paso)
+    ruta = ruta_derivada(almacen.hash, nombre)
+    if os.path.exists(ruta):
+        return np.load(ruta)
+
+    puntajes = calcular_puntajes(almacen.ruta, tamano, umbral, paso, almacen.total, progreso)
+    temporal = ruta + ".parcial.npy"
+    np.save(temporal, puntajes)
+    os.replace(temporal, ruta)
+    return puntajes
+
+
+def segmentos_actividad(puntajes, umbral=0.002, separacion=15, duracion_min=5):
+    # Tramos [inicio, fin) con puntaje sobre el umbral; los huecos más cortos
+    # que `separacion` frames se unen y se descartan los tramos muy cortos
+    activos = np.asarray(puntajes, dtype=np.float32) > umbral
+    if not activos.any():
+        return np.empty((0, 2), dtype=np.int64)
+
+    bordes = np.diff(np.concatenate(([0], activos.astype(np.int8), [0])))
+    inicios = np.flatnonzero(bordes == 1)
+    fines = np.flatnonzero(bordes == -1)
+
+    huecos = inicios[1:] - fines[:-1]
+    unir = huecos < separacion
+    inicios = np.concatenate((inicios[:1], inicios[1:][~unir]))
+    fines = np.concatenate((fines[:-1][~unir], fines[-1:]))
+
+    largos = fines - inicios >= duracion_min
+    return np.stack((inicios[largos], fines[largos]), axis=1).astype(np.int64)
+
+
+# Procesamiento por lotes: un video por proceso, sin Streamlit. Cada video
+# deja un .json con los tramos y las cajas (y opcionalmente un .csv con una
+# fila por caja y un video anotado).
+EXTENSIONES_VIDEO = (".mp4", ".avi", ".mov", ".mkv")
+
+
+def buscar_videos(rutas):
+    videos = []
+    for ruta in rutas:
+        if os.path.isdir(ruta):
+            for nombre in sorted(os.listdir(ruta)):
+                if nombre.lower().endswith(EXTENSIONES_VIDEO):
+                    videos.append(os.path.join(ruta, nombre))
+        else:
+            videos.append(ruta)
+    return videos
+
+
+def procesar_video(ruta, carpeta_salida, umbral=25, area_minima=700, paso=1, modelo="diferencia",
+                   escala_trabajo=1.0, tamano=(640, 480), max_frames=None, formatos=("json",),
+                   anotar=False, separacion=15, duracion_min=5):
+    inicio = time.perf_counter()
+    captura = cv2.VideoCapture(ruta)
+    if not captura.isOpened():
+        captura.release()
+        raise IOError("No se pudo abrir el video: " + ruta)
+    fps = captura.get(cv2.CAP_PROP_FPS)
+    fps = fps if fps > 0 else 30.0
+    total = int(captura.get(cv2.CAP_PROP_FRAME_COUNT))
+    ancho = int(captura.get(cv2.CAP_PROP_FRAME_WIDTH))
+    alto = int(captura.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    captura.release()
+    if ancho <= 0 or alto <= 0:
+        raise IOError("El video no informa su resolución: " + ruta)
+
+    # El análisis corre a `tamano`; las cajas se guardan en la resolución
+    # del video para poder ubicarlas en la grabación original
+    tamano_analisis = (ancho, alto) if tamano is None else tuple(tamano)
+    escala_x = ancho / float(tamano_analisis[0])
+    escala_y = alto / float(tamano_analisis[1])
+
+    def a_original(cajas):
+        return [(int(x * escala_x), int(y * escala_y), int(round(w * escala_x)), int(round(h * escala_y)))
+                for x, y, w, h in cajas]
+
+    base = os.path.join(carpeta_salida, os.path.splitext(os.path.basename(ruta))[0])
+    escritor = None
+    registros = []
+    for idx, cuadro, cajas in analizar_frames(ruta, umbral, area_minima, max_frames, paso,
+                                              modelo, escala_trabajo, tamano=tamano):
+        cajas = a_original(cajas)
+        registros.append((idx, cajas))
+        if anotar:
+            if escritor is None:
+                escritor = cv2.VideoWriter(base + "-anotado.mp4", cv2.VideoWriter_fourcc(*"mp4v"),
+                                           fps / paso, (ancho, alto))
+            if cuadro.shape[:2] != (alto, ancho):
+                cuadro = cv2.resize(cuadro, (ancho, alto))
+            escritor.write(anotar_cuadro(cuadro, cajas))
+    if escritor is not None:
+        escritor.release()
+
+    # Los frames saltados heredan el estado del último analizado
+    largo = registros[-1][0] + paso if registros else 0
+    activos = np.zeros(largo, dtype=np.float32)
+    for idx, cajas in registros:
+        if cajas:
+            activos[idx:idx + paso] = 1.0
+    segmentos = segmentos_actividad(activos, 0.5, separacion, duracion_min)
+
+    duracion = time.perf_counter() - inicio
+    resumen = {
+        "video": ruta,
+        "fps": fps,
+        "total_frames": total,
+        "ancho": ancho,
+        "alto": alto,
+        "tamano_analisis": list(tamano_analisis),
+        "frames_analizados": len(registros),
+        "segundos": duracion,
+        "segmentos": [{"inicio": int(a), "fin": int(b), "inicio_s": a / fps, "fin_s": b / fps}
+                      for a, b in segmentos],
+        "cajas": [{"frame": int(idx), "cajas": [list(c) for c in cajas]}
+                  for idx, cajas in registros if cajas],
+    }
+
+    if "json" in formatos:
+        with open(base + ".json", "w") as f:
+            json.dump(resumen, f, indent=2)
+    if "csv" in formatos:
+        with open(base + ".csv", "w", newline="") as f:
+            escritor_csv = csv.writer(f)
+            escritor_csv.writerow(["frame", "segundo", "x", "y", "w", "h"])
+            for idx, cajas in registros:
+                for x, y, w, h in cajas:
+                    escritor_csv.writerow([idx, round(idx / fps, 3), x, y, w, h])
+
+    # Al proceso principal solo vuelven las cifras, no las cajas
+    return {"video": ruta, "frames_analizados": len(registros), "segundos": duracion,
+            "segmentos": len(segmentos)}
+
+
+def _iniciar_trabajador():
+    # Un proceso por núcleo: OpenCV no debe abrir sus propios hilos encima
+    cv2.setNumThreads(1)
+
+
+def procesar_lote(videos, carpeta_salida, procesos=None, **opciones):
+    os.makedirs(carpeta_salida, exist_ok=True)
+    procesos = procesos or os.cpu_count() or 1
+    inicio = time.perf_counter()
+    resultados = []
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_trabajador) as pool:
+        tareas = {pool.submit(procesar_video, ruta, carpeta_salida, **opciones): ruta for ruta in videos}
+        for tarea in as_completed(tareas):
+            try:
+                resultado = tarea.result()
+            except Exception as error:
+                resultado = {"video": tareas[tarea], "error": str(error)}
+            resultados.append(resultado)
+            yield resultado
+    duracion = time.perf_counter() - inicio
+    frames = sum(r.get("frames_analizados", 0) for r in resultados)
+    yield {"videos": len(resultados), "frames_analizados": frames, "segundos": duracion,
+           "frames_por_segundo": frames / duracion if duracion else 0.0}
+
+
+def _leer_tamano(texto):
+    if texto == "original":
+        return None
+    ancho, alto = texto.lower().split("x")
+    return int(ancho), int(alto)
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description='Batch motion detection over videos or directories')
+    parser.add_argument("inputs", nargs="+",
+                        help="Video files or directories containing videos")
+    parser.add_argument("--output-dir", dest="output_dir", required=True,
+                        help="Directory for the per-video results")
+    parser.add_argument("--workers", dest="workers", type=int, default=None,
+                        help="Worker processes (default: one per core)")
+    parser.add_argument("--model", dest="model", choices=sorted(MODELOS), default="diferencia",
+                        help="Motion model")
+    parser.add_argument("--threshold", dest="threshold", type=int, default=25,
+                        help="Pixel difference threshold")
+    parser.add_argument("--min-area", dest="min_area", type=int, default=700,
+                        help="Minimum box area in pixels")
+    parser.add_argument("--stride", dest="stride", type=int, default=1,
+                        help="Analyze every n-th frame")
+    parser.add_argument("--work-scale", dest="work_scale", type=float, default=1.0,
+                        help="Resolution factor used by the motion model")
+    parser.add_argument("--size", dest="size", default="640x480",
+                        help="Frame size WxH for the analysis, or 'original'")
+    parser.add_argument("--max-frames", dest="max_frames", type=int, default=None,
+                        help="Maximum analyzed frames per video")
+    parser.add_argument("--format", dest="format", choices=["json", "csv", "both"], default="json",
+                        help="Output format for the boxes")
+    parser.add_argument("--annotate", dest="annotate", action="store_true",
+                        help="Also write an annotated video per input")
+    return parser
+
+
+if __name__ == '__main__':
+    args = build_arg_parser().parse_args()
+    videos = buscar_videos(args.inputs)
+    formatos = ("json", "csv") if args.format == "both" else (args.format,)
+    lote = procesar_lote(videos, args.output_dir, args.workers, umbral=args.threshold,
+                         area_minima=args.min_area, paso=args.stride, modelo=args.model,
+                         escala_trabajo=args.work_scale, tamano=_leer_tamano(args.size),
+                         max_frames=args.max_frames, formatos=formatos, anotar=args.annotate)
+    for resultado in lote:
+        if "error" in resultado:
+            print("%s: ERROR %s" % (resultado["video"], resultado["error"]))
+        elif "video" in resultado:
+            print("%s: %d frames, %d segments, %.1f frames/s" % (
+                resultado["video"], resultado["frames_analizados"], resultado["segmentos"],
+                resultado["frames_analizados"] / max(resultado["segundos"], 1e-9)))
+        else:
+            print("Total: %d videos, %d frames in %.1f s (%.1f frames/s)" % (
+                resultado["videos"], resultado["frames_analizados"], resultado["segundos"],
+                resultado["frames_por_segundo"]))
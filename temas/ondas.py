@@ -0,0 +1,146 @@
+import math
+import threading
+from collections import OrderedDict, namedtuple
+
+import cv2
+import numpy as np
+
+
+# Desplazamiento senoidal: int(amplitud * funcion(2 * 3.14 * indice / periodo)).
+# El periodo puede ser un número o una función (filas, columnas) -> número.
+Onda = namedtuple("Onda", ["amplitud", "periodo", "funcion"])
+
+# Cada efecto define la onda que desplaza las columnas (depende de la fila)
+# y la que desplaza las filas (depende de la columna).
+Efecto = namedtuple("Efecto", ["titulo", "onda_x", "onda_y"])
+
+EFECTOS = {
+    "vertical": Efecto("Onda Vertical", Onda(25.0, 180, math.sin), None),
+    "horizontal": Efecto("Onda Horizontal", None, Onda(16.0, 150, math.sin)),
+    "multidireccional": Efecto("Onda Multidireccional",
+                               Onda(20.0, 150, math.sin), Onda(20.0, 150, math.cos)),
+    "concavo": Efecto("Cóncavo", Onda(128.0, lambda filas, columnas: 2 * columnas, math.sin), None),
+}
+
+
+def _periodo(onda, filas, columnas):
+    if callable(onda.periodo):
+        return onda.periodo(filas, columnas)
+    return onda.periodo
+
+
+def _desplazamientos(onda, n, filas, columnas):
+    # Un valor por fila o por columna: n llamadas en lugar de filas * columnas
+    if onda is None:
+        return np.zeros(n, dtype=np.int64)
+    periodo = _periodo(onda, filas, columnas)
+    return np.fromiter(
+        (int(onda.amplitud * onda.funcion(2 * 3.14 * k / periodo)) for k in range(n)),
+        dtype=np.int64, count=n
+    )
+
+
+def calcular_mapas(efecto, filas, columnas):
+    if isinstance(efecto, str):
+        efecto = EFECTOS[efecto]
+
+    desp_x = _desplazamientos(efecto.onda_x, filas, filas, columnas)[:, None]
+    desp_y = _desplazamientos(efecto.onda_y, columnas, filas, columnas)[None, :]
+
+    j = np.arange(columnas)[None, :] + desp_x
+    i = np.arange(filas)[:, None] + desp_y
+
+    # Las posiciones que se salen por la derecha/abajo quedan en negro;
+    # las negativas se envuelven como el operador % de Python
+    validos = (j < columnas) & (i < filas)
+    mapa_x = np.where(validos, j % columnas, -1).astype(np.float32)
+    mapa_y = np.where(validos, i % filas, -1).astype(np.float32)
+    return mapa_x, mapa_y
+
+
+def compactar_mapas(mapa_x, mapa_y, dtype=np.int16):
+    # int16: un solo mapa CV_16SC2 (4 bytes por píxel en vez de 8).
+    # Solo representa coordenadas hasta 32767; si no caben se queda en float32.
+    if np.dtype(dtype) == np.int16 and max(mapa_x.shape) <= np.iinfo(np.int16).max:
+        mapa_xy, _ = cv2.convertMaps(mapa_x, mapa_y, cv2.CV_16SC2, nninterpolation=True)
+        return mapa_xy, None
+    return mapa_x, mapa_y
+
+
+def aplicar_mapas(img, mapa_x, mapa_y=None):
+    return cv2.remap(img, mapa_x, mapa_y, interpolation=cv2.INTER_NEAREST,
+                     borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+
+
+class CacheMapas(object):
+    # LRU acotado de mapas de desplazamiento. Los mapas solo dependen del
+    # efecto y del tamaño de la imagen, así que se comparten entre reruns,
+    # sesiones e imágenes distintas con la misma resolución.
+    def __init__(self, capacidad=16):
+        self.capacidad = capacidad
+        self.aciertos = 0
+        self.fallos = 0
+        self._mapas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def clave(self, efecto, filas, columnas, dtype):
+        ondas = []
+        for onda in (efecto.onda_x, efecto.onda_y):
+            if onda is None:
+                ondas.append(None)
+            else:
+                ondas.append((onda.amplitud, _periodo(onda, filas, columnas), onda.funcion.__name__))
+        return (efecto.titulo, tuple(ondas), filas, columnas, np.dtype(dtype).name)
+
+    def obtener(self, efecto, filas, columnas, dtype=np.int16):
+        if isinstance(efecto, str):
+            efecto = EFECTOS[efecto]
+        clave = self.clave(efecto, filas, columnas, dtype)
+
+        with self._lock:
+            mapas = self._mapas.get(clave)
+            if mapas is not None:
+                self._mapas.move_to_end(clave)
+                self.aciertos += 1
+                return mapas
+            self.fallos += 1
+
+        mapas = compactar_mapas(*calcular_mapas(efecto, filas, columnas), dtype=dtype)
+
+        with self._lock:
+            self._mapas[clave] = mapas
+            self._mapas.move_to_end(clave)
+            while len(self._mapas) > self.capacidad:
+                self._mapas.popitem(last=False)
+        return mapas
+
+    def estadisticas(self):
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": self.aciertos / total if total else 0.0,
+                "entradas": len(self._mapas),
+                "capacidad": self.capacidad,
+                "bytes": sum(m.nbytes for par in self._mapas.values() for m in par if m is not None),
+            }
+
+    def limpiar(self):
+        with self._lock:
+            self._mapas.clear()
+            self.aciertos = 0
+            self.fallos = 0
+
+
+# Cache compartida por todo el proceso
+cache_mapas = CacheMapas()
+
+
+def aplicar_efecto(img, efecto, cache=cache_mapas):
+    filas, columnas = img.shape[:2]
+    if cache is None:
+        mapa_x, mapa_y = calcular_mapas(efecto, filas, columnas)
+    else:
+        mapa_x, mapa_y = cache.obtener(efecto, filas, columnas)
+    return aplicar_mapas(img, mapa_x, mapa_y)
@@ -0,0 +1,484 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+
+# Energía de fondo: magnitud de Sobel en uint8, como en tema6
+def energia_sobel(gris):
+    grad_x = cv2.Sobel(gris, cv2.CV_64F, 1, 0, ksize=3)
+    grad_y = cv2.Sobel(gris, cv2.CV_64F, 0, 1, ksize=3)
+    abs_x = cv2.convertScaleAbs(grad_x)
+    abs_y = cv2.convertScaleAbs(grad_y)
+    return cv2.addWeighted(abs_x, 0.5, abs_y, 0.5, 0)
+
+
+# Energía hacia adelante (Rubinstein et al.): en vez de un valor por píxel,
+# el costo de llegar a (i, j) depende de qué vecinos nuevos quedan juntos al
+# quitarlo. Devuelve (..., 3) con los costos de venir de j-1, j y j+1,
+# en float32 y sin pasar por uint8. Las posiciones pueden ser arrays de
+# índices con broadcasting, para calcular la imagen entera o solo una banda.
+def costos_adelante(gris, filas_idx, columnas_idx):
+    filas, columnas = gris.shape[:2]
+    izquierda = gris[filas_idx, np.maximum(columnas_idx - 1, 0)].astype(np.float32)
+    derecha = gris[filas_idx, np.minimum(columnas_idx + 1, columnas - 1)].astype(np.float32)
+    arriba = gris[np.maximum(filas_idx - 1, 0), columnas_idx].astype(np.float32)
+
+    costo_u = np.abs(derecha - izquierda)
+    return np.stack([costo_u + np.abs(arriba - izquierda),
+                     costo_u,
+                     costo_u + np.abs(arriba - derecha)], axis=-1)
+
+
+# Programación dinámica por filas: cada fila se relaja de una vez tomando
+# el mínimo de los tres vecinos de la fila anterior (desplazados -1, 0, +1).
+# Solo se guarda la fila acumulada actual (float64) y los punteros de
+# retroceso como int8 (-1, 0, +1), en lugar de dos matrices float64.
+# `costos` (filas, columnas, 3) suma además un costo por transición, que es
+# como se enchufa la energía hacia adelante en el mismo motor.
+def acumular_energia(energia, costos=None):
+    filas, columnas = energia.shape[:2]
+    camino = np.zeros((filas, columnas), dtype=np.int8)
+
+    # Fila acumulada con un borde infinito a cada lado
+    previo = np.full(columnas + 2, np.inf)
+    previo[1:-1] = 0
+    izquierda = previo[:-2]
+    centro = previo[1:-1]
+    derecha = previo[2:]
+
+    mejor = np.empty(columnas)
+    candidato = np.empty(columnas)
+    fila_energia = np.empty(columnas)
+    menor = np.empty(columnas, dtype=bool)
+
+    for f in range(1, filas):
+        fila_energia[:] = energia[f]
+        paso = camino[f]
+
+        # Ante empates gana el vecino de la izquierda, luego el del centro,
+        # igual que el recorrido original con comparaciones estrictas
+        np.add(izquierda, fila_energia, out=mejor)
+        if costos is not None:
+            mejor += costos[f, :, 0]
+        paso[:] = -1
+
+        np.add(centro, fila_energia, out=candidato)
+        if costos is not None:
+            candidato += costos[f, :, 1]
+        np.less(candidato, mejor, out=menor)
+        np.minimum(mejor, candidato, out=mejor)
+        paso[menor] = 0
+
+        np.add(derecha, fila_energia, out=candidato)
+        if costos is not None:
+            candidato += costos[f, :, 2]
+        np.less(candidato, mejor, out=menor)
+        np.minimum(mejor, candidato, out=mejor)
+        paso[menor] = 1
+
+        centro[:] = mejor
+
+    return centro.copy(), camino
+
+
+def buscar_seam_vertical(energia, costos=None):
+    costo, camino = acumular_energia(energia, costos)
+    return recorrer_camino(camino, int(np.argmin(costo)))
+
+
+# Varios seams disjuntos con una sola pasada de programación dinámica: se
+# recorren hacia atrás todos los caminos a la vez y se eligen de menor a
+# mayor costo los que no pisan píxeles ya usados.
+def buscar_seams_verticales(energia, cantidad, costos=None):
+    costo, camino = acumular_energia(energia, costos)
+    filas, columnas = camino.shape
+
+    caminos = np.empty((columnas, filas), dtype=np.intp)
+    posicion = np.arange(columnas)
+    for i in range(filas - 1, -1, -1):
+        caminos[:, i] = posicion
+        posicion = posicion + camino[i, posicion]
+
+    ocupados = np.zeros((filas, columnas), dtype=bool)
+    todas = np.arange(filas)
+    elegidos = []
+    for final in np.argsort(costo, kind="stable"):
+        seam = caminos[final]
+        if ocupados[todas, seam].any():
+            continue
+        ocupados[todas, seam] = True
+        elegidos.append(seam)
+        if len(elegidos) == cantidad:
+            break
+    return np.array(elegidos, dtype=np.intp)
+
+
+def recorrer_camino(camino, columna_final):
+    filas = camino.shape[0]
+    seam = np.empty(filas, dtype=np.intp)
+    seam[filas - 1] = columna_final
+    for i in range(filas - 1, 0, -1):
+        seam[i - 1] = seam[i] + camino[i, seam[i]]
+    return seam
+
+
+# Quita un seam (una columna por fila) con una máscara booleana y un
+# reshape: una sola copia en C, sirve igual para la imagen BGR que para
+# la matriz de energía o cualquier matriz (filas, columnas, ...).
+# También acepta un lote de seams disjuntos con forma (k, filas).
+def eliminar_seam_vertical(matriz, seam):
+    filas, columnas = matriz.shape[:2]
+    seam = np.asarray(seam)
+    cantidad = 1 if seam.ndim == 1 else seam.shape[0]
+    mascara = np.ones((filas, columnas), dtype=bool)
+    mascara[np.arange(filas), seam] = False
+    return matriz[mascara].reshape((filas, columnas - cantidad) + matriz.shape[2:])
+
+
+# Inserta un lote de seams (en coordenadas de la imagen, forma (k, filas)):
+# cada píxel del seam se duplica y la copia toma el promedio con su vecino
+# derecho. Ensancha la imagen k columnas con un único repeat.
+def insertar_seams(matriz, seams):
+    seams = np.atleast_2d(np.asarray(seams, dtype=np.intp))
+    cantidad = seams.shape[0]
+    filas, columnas = matriz.shape[:2]
+    todas = np.arange(filas)
+
+    repeticiones = np.ones((filas, columnas), dtype=np.intp)
+    np.add.at(repeticiones, (todas, seams), 1)
+    resultado = np.repeat(matriz.reshape((filas * columnas,) + matriz.shape[2:]),
+                          repeticiones.ravel(), axis=0)
+    resultado = resultado.reshape((filas, columnas + cantidad) + matriz.shape[2:])
+
+    ordenados = np.sort(seams, axis=0).T
+    vecinos = np.minimum(ordenados + 1, columnas - 1)
+    suma = matriz[todas[:, None], ordenados].astype(np.uint16) \
+        + matriz[todas[:, None], vecinos].astype(np.uint16)
+    copias = ordenados + np.arange(cantidad) + 1
+    resultado[todas[:, None], copias] = ((suma + 1) // 2).astype(matriz.dtype)
+    return resultado
+
+
+class MapaColumnas(object):
+    # Mapa compacto de índices: para cada píxel restante guarda la columna
+    # que ocupaba en la imagen original. Eliminar seams solo toca este mapa;
+    # la imagen se reconstruye al final con un único gather.
+    def __init__(self, filas, columnas):
+        dtype = np.int16 if columnas <= np.iinfo(np.int16).max else np.int32
+        self.indices = np.tile(np.arange(columnas, dtype=dtype), (filas, 1))
+
+    @property
+    def shape(self):
+        return self.indices.shape
+
+    def eliminar(self, seam):
+        self.indices = eliminar_seam_vertical(self.indices, seam)
+
+    def columnas_originales(self, seam):
+        # Traduce uno o varios seams de coordenadas actuales a originales
+        return self.indices[np.arange(self.indices.shape[0]), seam]
+
+    def materializar(self, matriz):
+        indices = self.indices.astype(np.intp)
+        if matriz.ndim == 3:
+            indices = indices[:, :, None]
+        return np.take_along_axis(matriz, indices, axis=1)
+
+
+def _reflejar(indices, n):
+    # Borde BORDER_REFLECT_101 (el que usa cv2.Sobel por defecto)
+    indices = np.abs(indices)
+    return np.where(indices >= n, 2 * (n - 1) - indices, indices)
+
+
+class EnergiaIncremental(object):
+    # Mantiene el gris, la energía y la máscara del objeto como arrays
+    # persistentes. Al quitar un seam solo cambia la energía de las columnas
+    # s-2..s+1 de cada fila (el soporte de Sobel 3x3 es de ±1 columna y el
+    # seam se mueve como mucho una columna entre filas), así que el resto se
+    # desplaza con la máscara y solo se recalcula esa banda. Acepta también
+    # un lote de seams disjuntos.
+    # Con criterio "adelante" la energía por píxel es cero y lo que se
+    # mantiene (con la misma banda) son los costos de transición.
+    def __init__(self, imagen, mascara=None, criterio="sobel"):
+        if imagen.ndim == 3:
+            imagen = cv2.cvtColor(imagen, cv2.COLOR_BGR2GRAY)
+        self.gris = imagen
+        self.mascara = mascara
+        self.criterio = criterio
+        self.costos = None
+        filas, columnas = self.gris.shape
+
+        if criterio == "adelante":
+            self.energia = np.zeros((filas, columnas), dtype=np.uint8)
+            self.costos = costos_adelante(self.gris, np.arange(filas)[:, None],
+                                          np.arange(columnas)[None, :])
+            if self.mascara is not None:
+                self.costos[self.mascara] = 0
+        else:
+            self.energia = energia_sobel(self.gris)
+            if self.mascara is not None:
+                self.energia[self.mascara] = 0
+        # Suma de la energía de todos los píxeles quitados
+        self.costo = 0.0
+
+    def costo_seam(self, seam):
+        seam = np.atleast_2d(np.asarray(seam, dtype=np.intp))
+        todas = np.arange(seam.shape[1])
+        costo = float(self.energia[todas, seam].sum())
+        if self.costos is not None:
+            # Costo de la transición usada en cada fila (la primera no cuenta)
+            paso = seam[:, 1:] - seam[:, :-1]
+            costo += float(self.costos[todas[1:], seam[:, 1:], 1 - paso].sum())
+        return costo
+
+    def _recalcular(self):
+        filas, columnas = self.gris.shape
+        if self.criterio == "adelante":
+            self.costos = costos_adelante(self.gris, np.arange(filas)[:, None],
+                                          np.arange(columnas)[None, :])
+            if self.mascara is not None:
+                self.costos[self.mascara] = 0
+        else:
+            self.energia = energia_sobel(self.gris)
+            if self.mascara is not None:
+                self.energia[self.mascara] = 0
+
+    def eliminar(self, seam):
+        self.costo += self.costo_seam(seam)
+        self.gris = eliminar_seam_vertical(self.gris, seam)
+        self.energia = eliminar_seam_vertical(self.energia, seam)
+        if self.costos is not None:
+            self.costos = eliminar_seam_vertical(self.costos, seam)
+        if self.mascara is not None:
+            self.mascara = eliminar_seam_vertical(self.mascara, seam)
+
+        filas, columnas = self.gris.shape
+        if filas < 3 or columnas < 4:
+            self._recalcular()
+            return
+
+        # Posición de cada seam ya quitado: ordenados por fila, el j-ésimo
+        # quedó corrido j columnas y sigue moviéndose a lo sumo una columna
+        # entre filas
+        seams = np.sort(np.atleast_2d(np.asarray(seam, dtype=np.intp)), axis=0)
+        seam = (seams - np.arange(seams.shape[0])[:, None]).ravel()
+        fila = np.tile(np.arange(filas), seams.shape[0])[:, None]
+
+        columnas_banda = seam[:, None] + np.arange(-2, 2)
+        validas = (columnas_banda >= 0) & (columnas_banda < columnas)
+        filas_banda = np.broadcast_to(fila, columnas_banda.shape)[validas]
+        columnas_banda = columnas_banda[validas]
+
+        if self.criterio == "adelante":
+            banda = costos_adelante(self.gris, filas_banda, columnas_banda)
+            if self.mascara is not None:
+                banda[self.mascara[filas_banda, columnas_banda]] = 0
+            self.costos[filas_banda, columnas_banda] = banda
+            return
+
+        # Vecindario de 3 filas x 6 columnas alrededor de cada banda de 4
+        ventana = _reflejar(seam[:, None] + np.arange(-3, 3), columnas)
+        arriba = self.gris[_reflejar(fila - 1, filas), ventana].astype(np.float64)
+        medio = self.gris[fila, ventana].astype(np.float64)
+        abajo = self.gris[_reflejar(fila + 1, filas), ventana].astype(np.float64)
+
+        grad_x = (arriba[:, 2:] - arriba[:, :-2]) + 2 * (medio[:, 2:] - medio[:, :-2]) \
+            + (abajo[:, 2:] - abajo[:, :-2])
+        grad_y = (abajo[:, :-2] + 2 * abajo[:, 1:-1] + abajo[:, 2:]) \
+            - (arriba[:, :-2] + 2 * arriba[:, 1:-1] + arriba[:, 2:])
+        banda = cv2.addWeighted(cv2.convertScaleAbs(grad_x), 0.5,
+                                cv2.convertScaleAbs(grad_y), 0.5, 0)
+
+        banda = banda[validas]
+        if self.mascara is not None:
+            banda[self.mascara[filas_banda, columnas_banda]] = 0
+        self.energia[filas_banda, columnas_banda] = banda
+
+
+# Seam carving multirresolución: el seam se busca en un nivel reducido con
+# cv2.pyrDown, se proyecta a resolución completa y se refina con la misma
+# programación dinámica pero solo dentro de un corredor alrededor de la
+# proyección. `niveles` es la perilla calidad/velocidad (0 = exacto).
+def refinar_seam(energia, guia, radio, ocupados=None, costos=None):
+    filas, columnas = energia.shape[:2]
+    ancho = min(2 * radio + 1, columnas)
+    inicio = np.clip(guia - radio, 0, columnas - ancho)
+    indices = inicio[:, None] + np.arange(ancho)
+
+    # Energía del corredor de una sola vez: (filas, ancho)
+    corredor = energia[np.arange(filas)[:, None], indices].astype(np.float64)
+    if ocupados is not None:
+        corredor[ocupados[np.arange(filas)[:, None], indices]] = np.inf
+    if costos is not None:
+        # (filas, 3, ancho) para sumarlo directo a los tres candidatos
+        costos = costos[np.arange(filas)[:, None], indices].transpose(0, 2, 1)
+        transicion = np.empty((3, ancho))
+
+    # Fila acumulada con relleno infinito suficiente para el mayor salto
+    # del corredor entre filas; las ventanas deslizantes dan los tres
+    # vecinos de cada columna sin copiar ni indexar con arrays.
+    saltos = np.diff(inicio)
+    relleno = int(np.abs(saltos).max(initial=0)) + 1
+    previo = np.full(ancho + 2 * relleno, np.inf)
+    actual = previo[relleno:relleno + ancho]
+    actual[:] = np.where(np.isinf(corredor[0]), np.inf, 0)
+    ventanas = np.lib.stride_tricks.sliding_window_view(previo, ancho)
+
+    camino = np.zeros((filas, ancho), dtype=np.intp)
+    mejor = np.empty(ancho)
+    for f in range(1, filas):
+        desde = relleno - 1 + saltos[f - 1]
+        candidatos = ventanas[desde:desde + 3]
+        if costos is not None:
+            candidatos = np.add(candidatos, costos[f], out=transicion)
+        candidatos.argmin(axis=0, out=camino[f])
+        np.minimum.reduce(candidatos, axis=0, out=mejor)
+        np.add(mejor, corredor[f], out=actual)
+
+    final = int(np.argmin(actual))
+    if not np.isfinite(actual[final]):
+        return None
+
+    seam = np.empty(filas, dtype=np.intp)
+    seam[filas - 1] = inicio[filas - 1] + final
+    for i in range(filas - 1, 0, -1):
+        seam[i - 1] = seam[i] + camino[i, seam[i] - inicio[i]] - 1
+    return seam
+
+
+def proyectar_seam(seam, niveles, filas, columnas):
+    # Interpola entre los centros de las filas del nivel reducido
+    factor = 2 ** niveles
+    centros = np.arange(len(seam)) * factor + (factor - 1) / 2.0
+    guia = np.interp(np.arange(filas), centros, seam * factor + (factor - 1) / 2.0)
+    return np.clip(np.rint(guia).astype(np.intp), 0, columnas - 1)
+
+
+def buscar_lote(energia, cantidad, niveles=0, costos=None):
+    filas, columnas = energia.shape[:2]
+    # Sin niveles, o si la imagen reducida quedaría demasiado pequeña: exacto
+    if niveles <= 0 or min(filas, columnas) >> niveles < 8:
+        if cantidad == 1:
+            return buscar_seam_vertical(energia, costos)[None]
+        return buscar_seams_verticales(energia, cantidad, costos)
+
+    # En el nivel reducido los costos de transición se aproximan por píxel
+    reducida = energia.astype(np.float32)
+    if costos is not None:
+        reducida += costos[:, :, 1]
+    for _ in range(niveles):
+        reducida = cv2.pyrDown(reducida)
+
+    radio = 2 ** niveles
+    ocupados = np.zeros((filas, columnas), dtype=bool) if cantidad > 1 else None
+    if cantidad == 1:
+        reducidos = buscar_seam_vertical(reducida)[None]
+    else:
+        reducidos = buscar_seams_verticales(reducida, cantidad)
+
+    elegidos = []
+    for seam_reducido in reducidos:
+        guia = proyectar_seam(seam_reducido, niveles, filas, columnas)
+        seam = refinar_seam(energia, guia, radio, ocupados, costos)
+        if seam is None:
+            continue
+        if ocupados is not None:
+            ocupados[np.arange(filas), seam] = True
+        elegidos.append(seam)
+
+    if not elegidos:
+        return buscar_seam_vertical(energia, costos)[None]
+    return np.array(elegidos, dtype=np.intp)
+
+
+# Quita `cantidad` columnas de la imagen en lotes de `por_lote` seams por
+# pasada. Devuelve la imagen reducida y los seams en coordenadas originales.
+def reducir_ancho(imagen, cantidad, mascara=None, por_lote=1, progreso=None, niveles=0,
+                  criterio="sobel"):
+    energia = EnergiaIncremental(imagen, mascara, criterio)
+    mapa = MapaColumnas(*imagen.shape[:2])
+    originales = []
+    quitados = 0
+
+    while quitados < cantidad:
+        seams = buscar_lote(energia.energia, min(por_lote, cantidad - quitados), niveles,
+                            energia.costos)
+        originales.extend(mapa.columnas_originales(seams))
+        energia.eliminar(seams)
+        mapa.eliminar(seams)
+        quitados += len(seams)
+        if progreso is not None:
+            progreso(quitados / cantidad)
+
+    return mapa.materializar(imagen), np.array(originales, dtype=np.intp)
+
+
+# Ensancha la imagen `cantidad` columnas duplicando los seams de menor
+# energía (se buscan quitándolos de una copia y se insertan todos juntos).
+# Si se pide más de la mitad del ancho se hace en varias rondas.
+def ensanchar(imagen, cantidad, por_lote=1, progreso=None, niveles=0, criterio="sobel"):
+    insertados = 0
+    while insertados < cantidad:
+        ronda = min(cantidad - insertados, max(1, imagen.shape[1] // 2))
+        base = insertados
+
+        def avance(fraccion):
+            if progreso is not None:
+                progreso((base + fraccion * ronda) / cantidad)
+
+        _, seams = reducir_ancho(imagen, ronda, por_lote=por_lote, progreso=avance,
+                                 niveles=niveles, criterio=criterio)
+        imagen = insertar_seams(imagen, seams)
+        insertados += ronda
+    return imagen
+
+
+# Compara el carving exacto con el multirresolución sobre la misma imagen:
+# tiempo total y diferencia en la energía acumulada de los píxeles quitados.
+def comparar_piramide(imagen, cantidad, niveles, por_lote=1, criterio="sobel"):
+    resultados = {}
+    for nivel in (0, niveles):
+        energia = EnergiaIncremental(imagen, criterio=criterio)
+        inicio = time.perf_counter()
+        quitados = 0
+        while quitados < cantidad:
+            seams = buscar_lote(energia.energia, min(por_lote, cantidad - quitados), nivel,
+                                energia.costos)
+            energia.eliminar(seams)
+            quitados += len(seams)
+        resultados[nivel] = {"tiempo": time.perf_counter() - inicio, "costo": energia.costo}
+
+    exacto, rapido = resultados[0], resultados[niveles]
+    return {
+        "exacto": exacto,
+        "piramide": rapido,
+        "aceleracion": exacto["tiempo"] / max(rapido["tiempo"], 1e-9),
+        "diferencia_costo": (rapido["costo"] - exacto["costo"]) / max(exacto["costo"], 1e-9),
+    }
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description='Benchmark of exact vs pyramid seam carving')
+    parser.add_argument("--input-image", dest="input_image", required=True,
+                        help="Image to carve")
+    parser.add_argument("--seams", dest="seams", type=int, default=50,
+                        help="Number of seams to remove")
+    parser.add_argument("--levels", dest="levels", type=int, default=2,
+                        help="Pyramid levels for the coarse-to-fine mode")
+    parser.add_argument("--batch", dest="batch", type=int, default=1,
+                        help="Seams per DP pass")
+    parser.add_argument("--energy", dest="energy", choices=["sobel", "adelante"], default="sobel",
+                        help="Energy criterion (backward Sobel or forward energy)")
+    return parser
+
+
+if __name__ == '__main__':
+    args = build_arg_parser().parse_args()
+    imagen = cv2.imread(args.input_image)
+    res = comparar_piramide(imagen, args.seams, args.levels, args.batch, args.energy)
+    print("Exact:   %.3f s  cost %.0f" % (res["exacto"]["tiempo"], res["exacto"]["costo"]))
+    print("Pyramid: %.3f s  cost %.0f" % (res["piramide"]["tiempo"], res["piramide"]["costo"]))
+    print("Speed-up: %.2fx  cost difference: %+.2f%%" % (res["aceleracion"], 100 * res["diferencia_costo"]))
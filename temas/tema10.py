@@ -1,8 +1,9 @@
 import streamlit as st
-import cv2
-import tempfile
-import numpy as np
-import matplotlib.pyplot as plt
+
+from temas.movimiento import (MODELOS, analizar_frames, anotar_cuadro, indice_movimiento,
+                              segmentos_actividad)
+from temas.videos import abrir_video
+from temas.visor import VisorFrames
 
 
 def run():
@@ -11,10 +12,7 @@ def run():
     archivo_video = st.file_uploader("Sube un video", type=["mp4", "avi", "mov"])
     
     if archivo_video:
-        # Guardar temporalmente
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
-        temp_file.write(archivo_video.read())
-        temp_file.close()
+        almacen = abrir_video(archivo_video)
         
         # Configuración
         col1, col2 = st.columns(2)
@@ -24,76 +22,61 @@ def run():
         with col2:
             intervalo = st.slider("Mostrar cada n frames", 1, 10, 3)
             limite = st.slider("Frames máximos", 50, 500, 200)
+        paso = st.slider("Analizar 1 de cada n frames", 1, 5, 1)
+        calidad = st.slider("Calidad de visualización (JPEG)", 30, 95, 75)
+        
+        col3, col4 = st.columns(2)
+        with col3:
+            modelo = st.selectbox("Modelo de movimiento", list(MODELOS),
+                                  format_func=MODELOS.get)
+        with col4:
+            escala_trabajo = st.slider("Resolución de trabajo", 0.25, 1.0, 1.0, 0.25)
+        
+        # Índice de actividad: se calcula una vez por video y se reutiliza
+        segmentos = None
+        if st.checkbox("Saltar a los tramos con actividad"):
+            barra = st.progress(0)
+            puntajes = indice_movimiento(almacen, progreso=barra.progress)
+            barra.empty()
+            segmentos = segmentos_actividad(puntajes)
+            st.line_chart(puntajes.astype("float32"))
+            
+            if len(segmentos) == 0:
+                st.warning("No se encontraron tramos con actividad")
+            else:
+                fps = almacen.fps or 1
+                opciones = ["Todos los tramos"] + [
+                    f"{a / fps:.1f}s - {b / fps:.1f}s ({b - a} frames)" for a, b in segmentos
+                ]
+                elegido = st.selectbox(f"{len(segmentos)} tramos con actividad",
+                                       range(len(opciones)), format_func=opciones.__getitem__)
+                if elegido > 0:
+                    segmentos = segmentos[elegido - 1:elegido]
         
         if st.button("Procesar", type="primary"):
             with st.spinner("Analizando movimiento..."):
-                detectar_movimiento(temp_file.name, umbral_mov, area_min, intervalo, limite)
+                detectar_movimiento(almacen, umbral_mov, area_min, intervalo, limite, paso,
+                                    calidad, modelo, escala_trabajo, segmentos)
 
 
-def detectar_movimiento(ruta, umbral, area_minima, mostrar_cada, max_frames):
-    video = cv2.VideoCapture(ruta)
-    
+def detectar_movimiento(almacen, umbral, area_minima, mostrar_cada, max_frames, paso=1,
+                        calidad=75, modelo="diferencia", escala_trabajo=1.0, segmentos=None):
     # Primer frame
-    exito, cuadro_inicial = video.read()
-    if not exito:
+    if almacen.frame(0) is None:
         st.error("Error al leer video")
         return
     
-    cuadro_inicial = cv2.resize(cuadro_inicial, (640, 480))
-    gris_previo = cv2.cvtColor(cuadro_inicial, cv2.COLOR_BGR2GRAY)
-    
-    contenedor = st.empty()
+    visor = VisorFrames(calidad=calidad)
     contador = 0
-    
-    while contador < max_frames:
-        exito, cuadro_actual = video.read()
-        if not exito:
-            break
-        
+    for idx, cuadro_actual, cajas in analizar_frames(almacen, umbral, area_minima, max_frames, paso,
+                                                     modelo, escala_trabajo, segmentos):
         contador += 1
-        cuadro_actual = cv2.resize(cuadro_actual, (640, 480))
-        gris_actual = cv2.cvtColor(cuadro_actual, cv2.COLOR_BGR2GRAY)
-        
-        # Detectar diferencias
-        diferencia = cv2.absdiff(gris_previo, gris_actual)
-        _, binario = cv2.threshold(diferencia, umbral, 255, cv2.THRESH_BINARY)
-        
-        # Morfología
-        elemento = np.ones((7, 7), np.uint8)
-        binario = cv2.dilate(binario, elemento, iterations=1)
-        
-        # Contornos
-        contornos, _ = cv2.findContours(binario, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        # Marcar objetos
-        hay_movimiento = False
-        for cnt in contornos:
-            if cv2.contourArea(cnt) > area_minima:
-                hay_movimiento = True
-                x, y, w, h = cv2.boundingRect(cnt)
-                cv2.rectangle(cuadro_actual, (x, y), (x + w, y + h), (255, 0, 0), 3)
-        
-        # Texto de estado
-        texto = "MOVIMIENTO" if hay_movimiento else "QUIETO"
-        color = (0, 255, 0) if hay_movimiento else (200, 200, 0)
-        cv2.putText(cuadro_actual, texto, (25, 50),
-                    cv2.FONT_HERSHEY_SIMPLEX, 1.0, color, 3)
-        
-        gris_previo = gris_actual.copy()
+        anotar_cuadro(cuadro_actual, cajas)
         
         # Visualizar
         if contador % mostrar_cada == 0:
-            rgb = cv2.cvtColor(cuadro_actual, cv2.COLOR_BGR2RGB)
-            
-            figura, eje = plt.subplots(figsize=(10, 7))
-            eje.imshow(rgb)
-            eje.axis('off')
-            eje.set_title(f"Frame {contador}", fontsize=14)
-            
-            contenedor.pyplot(figura)
-            plt.close(figura)
+            visor.mostrar(cuadro_actual, f"Frame {idx + 1}")
     
-    video.release()
     st.success(f"Análisis completado: {contador} frames")
 
 
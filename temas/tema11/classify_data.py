@@ -1,5 +1,10 @@
 import argparse
+import json
+import os
+import sys
+import time
 import _pickle as pickle 
+from concurrent.futures import ProcessPoolExecutor
  
 import cv2 
 import numpy as np 
@@ -32,11 +37,103 @@ class ImageClassifier(object):
         retval, image_tag = self.ann.predict(feature_vector)
         return self.classify(image_tag)
 
+    # Tags for several images with a single ANN call
+    def getImageTags(self, imgs):
+        quantizer = cf.Quantizer()
+        feature_vectors = [quantizer.get_feature_vector(cf.resize_to_size(img), self.kmeans, self.centroids)
+                           for img in imgs]
+        return self.classify_batch(np.vstack(feature_vectors))
+
+    def classify_batch(self, feature_vectors, threshold=None):
+        retval, outputs = self.ann.predict(np.asarray(feature_vectors, dtype=np.float32))
+        return list(self.le.inverse_transform(np.asarray(outputs), threshold))
+
+
+# Batch mode: images are decoded and dense-SIFTed in a pool of worker
+# processes (one SIFT extractor and one codebook copy per worker), the
+# feature vectors of a batch are stacked and the ANN runs once per batch
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+_worker = {}
+
+
+def _init_worker(kmeans, centroids):
+    cv2.setNumThreads(1)
+    _worker['kmeans'] = kmeans
+    _worker['centroids'] = centroids
+    _worker['quantizer'] = cf.Quantizer()
+
+
+def extract_features(path):
+    # Returns (path, feature vector or None, timings in ms)
+    start = time.perf_counter()
+    img = cv2.imread(path)
+    if img is None:
+        return path, None, {'decode_ms': 1e3 * (time.perf_counter() - start)}
+    img = cf.resize_to_size(img)
+    decoded = time.perf_counter()
+    fv = _worker['quantizer'].get_feature_vector(img, _worker['kmeans'], _worker['centroids'])
+    done = time.perf_counter()
+    return path, fv, {'decode_ms': 1e3 * (decoded - start), 'features_ms': 1e3 * (done - decoded)}
+
+
+def list_images(inputs):
+    # Directories are walked recursively; text files hold one path per line
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, dirs, files in os.walk(item):
+                dirs.sort()
+                paths += [os.path.join(root, x) for x in sorted(files)
+                          if x.lower().endswith(IMAGE_EXTENSIONS)]
+        elif item.lower().endswith('.txt'):
+            with open(item) as f:
+                paths += [line.strip() for line in f if line.strip()]
+        else:
+            paths.append(item)
+    return paths
+
+
+def classify_paths(classifier, paths, workers=None, batch_size=256):
+    # Generator of one result dict per image, in input order
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(classifier.kmeans, classifier.centroids)) as pool:
+        for first in range(0, len(paths), batch_size):
+            batch = paths[first:first + batch_size]
+            start = time.perf_counter()
+            extracted = list(pool.map(extract_features, batch,
+                                      chunksize=max(1, len(batch) // (4 * workers))))
+            extraction_ms = 1e3 * (time.perf_counter() - start)
+
+            valid = [fv for _, fv, _ in extracted if fv is not None]
+            start = time.perf_counter()
+            tags = iter(classifier.classify_batch(np.vstack(valid)) if valid else [])
+            predict_ms = 1e3 * (time.perf_counter() - start)
+
+            for path, fv, timings in extracted:
+                result = {'image': path, 'label': None if fv is None else str(next(tags))}
+                if fv is None:
+                    result['error'] = 'unreadable image'
+                result.update({k: round(v, 2) for k, v in timings.items()})
+                result['batch_extraction_ms'] = round(extraction_ms, 2)
+                result['batch_predict_ms'] = round(predict_ms, 2)
+                result['batch_size'] = len(batch)
+                yield result
+
 
 def build_arg_parser(): 
     parser = argparse.ArgumentParser(description='Extracts features from each line and classifies the data') 
-    parser.add_argument("--input-image", dest="input_image", required=True,
+    parser.add_argument("--input-image", dest="input_image", required=False,
         help="Input image to be classified")
+    parser.add_argument("--inputs", dest="inputs", nargs="+",
+        help="Batch mode: image files, directories or .txt files listing images")
+    parser.add_argument("--output", dest="output", default=None,
+        help="JSONL file for the batch results (default: stdout)")
+    parser.add_argument("--workers", dest="workers", type=int, default=None,
+        help="Feature extraction processes (default: one per core)")
+    parser.add_argument("--batch-size", dest="batch_size", type=int, default=256,
+        help="Images per ANN predict call")
     parser.add_argument("--codebook-file", dest="codebook_file", required=True,
         help="File containing the codebook")
     parser.add_argument("--ann-file", dest="ann_file", required=True,
@@ -46,9 +143,30 @@ def build_arg_parser():
     return parser 
  
 if __name__=='__main__': 
-    args = build_arg_parser().parse_args() 
+    parser = build_arg_parser()
+    args = parser.parse_args() 
     codebook_file = args.codebook_file
-    input_image = cv2.imread(args.input_image) 
- 
-    tag = ImageClassifier(args.ann_file, args.le_file, codebook_file).getImageTag(input_image)
-    print("Output class:", tag)
\ No newline at end of file
+    classifier = ImageClassifier(args.ann_file, args.le_file, codebook_file)
+
+    if args.inputs:
+        paths = list_images(args.inputs)
+        out = open(args.output, 'w') if args.output else sys.stdout
+        start = time.perf_counter()
+        count = 0
+        try:
+            for result in classify_paths(classifier, paths, args.workers, args.batch_size):
+                out.write(json.dumps(result) + '\n')
+                out.flush()
+                count += 1
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        elapsed = time.perf_counter() - start
+        print("Classified %d images in %.1f s (%.1f images/s)" % (count, elapsed, count / max(elapsed, 1e-9)),
+              file=sys.stderr)
+    elif args.input_image:
+        input_image = cv2.imread(args.input_image) 
+        tag = classifier.getImageTag(input_image)
+        print("Output class:", tag)
+    else:
+        parser.error("one of --input-image or --inputs is required")
\ No newline at end of file
@@ -1,15 +1,30 @@
 import os
 import sys
 import argparse
+import hashlib
+import threading
+import time
 import _pickle as pickle
 import json
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
 
 import cv2
 import numpy as np
-from sklearn.cluster import KMeans
+
+# The codebook trainer is shared with tema9 and lives in the temas package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from temas.codebook import EntrenadorCodebook
 
 
 class DenseDetector():
+    # Keypoint grids shared by every detector in the process. resize_to_size
+    # leaves most images with only a few shapes, so each grid is built once
+    # per (rows, cols, step, scale, bound) and the same tuple is reused
+    _grids = OrderedDict()
+    _grids_lock = threading.Lock()
+    max_grids = 64
+
     def __init__(self, step_size=20, feature_scale=20, img_bound=20):
         # Create a dense feature detector
         self.initXyStep = step_size
@@ -17,11 +32,25 @@ class DenseDetector():
         self.initImgBound = img_bound
 
     def detect(self, img):
-        keypoints = []
         rows, cols = img.shape[:2]
-        for x in range(self.initImgBound, rows, self.initFeatureScale):
-            for y in range(self.initImgBound, cols, self.initFeatureScale):
-                keypoints.append(cv2.KeyPoint(float(x), float(y), self.initXyStep))
+        key = (rows, cols, self.initXyStep, self.initFeatureScale, self.initImgBound)
+        with self._grids_lock:
+            keypoints = self._grids.get(key)
+            if keypoints is not None:
+                self._grids.move_to_end(key)
+                return keypoints
+
+        # Same order and coordinates as the original double loop: the row
+        # index goes in x and the column index in y
+        x, y = np.mgrid[self.initImgBound:rows:self.initFeatureScale,
+                        self.initImgBound:cols:self.initFeatureScale]
+        points = np.stack((x.ravel(), y.ravel()), axis=1).astype(np.float32)
+        keypoints = cv2.KeyPoint.convert(points, size=float(self.initXyStep), response=0)
+
+        with self._grids_lock:
+            self._grids[key] = keypoints
+            while len(self._grids) > self.max_grids:
+                self._grids.popitem(last=False)
         return keypoints
 
 
@@ -37,6 +66,15 @@ class SIFTExtractor():
         kps, des = self.extractor.compute(gray_image, kps)
         return kps, des
 
+    # Descriptors of several images with a single native compute call
+    def compute_batch(self, images, kps_list):
+        if any(image is None for image in images):
+            print("Not a valid image")
+            raise TypeError
+        gray_images = [cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) for image in images]
+        kps_list, des_list = self.extractor.compute(gray_images, list(kps_list))
+        return kps_list, des_list
+
 # Vector quantization
 class Quantizer(object):
     def __init__(self, num_clusters=32):
@@ -46,17 +84,26 @@ class Quantizer(object):
         self.num_retries = 10
 
     def quantize(self, datapoints):
-        # Create KMeans object
-        datapoints = np.asarray(datapoints, dtype=np.float32)
-        kmeans = KMeans(self.num_clusters,
-                        n_init=max(self.num_retries, 1),
-                        max_iter=10, tol=1.0)
-
-        # Run KMeans on the datapoints
-        res = kmeans.fit(datapoints)
+        return self.quantize_stream([np.asarray(datapoints, dtype=np.float32)])
+
+    def codebook_trainer(self, max_bytes=256 * 1024 * 1024, checkpoint=None):
+        return EntrenadorCodebook(self.num_clusters, max_bytes=max_bytes, checkpoint=checkpoint)
+
+    # Codebook from an iterable of descriptor chunks (one per image, or
+    # (key, descriptors) pairs when resuming from a checkpoint) with
+    # mini-batch KMeans and bounded memory
+    def quantize_stream(self, chunks, max_bytes=256 * 1024 * 1024, checkpoint=None, trainer=None):
+        if trainer is None:
+            trainer = self.codebook_trainer(max_bytes, checkpoint)
+        for chunk in chunks:
+            if isinstance(chunk, tuple):
+                trainer.agregar(chunk[1], chunk[0])
+            else:
+                trainer.agregar(chunk)
+        kmeans = trainer.terminar()
 
         # Extract the centroids of those clusters
-        centroids = res.cluster_centers_
+        centroids = kmeans.cluster_centers_
 
         return kmeans, centroids
 
@@ -72,15 +119,15 @@ class Quantizer(object):
     def get_feature_vector(self, img, kmeans, centroids):
         kps = DenseDetector().detect(img)
         kps, fvs = self.extractor.compute(img, kps)
+        return self.get_feature_vector_from_descriptors(fvs, kmeans)
 
+    # Normalized histogram of visual words for already extracted descriptors
+    def get_feature_vector_from_descriptors(self, fvs, kmeans):
         # ✅ Conversión para evitar el error del tipo de dato
         fvs = np.asarray(fvs, dtype=np.float32)
 
         labels = kmeans.predict(fvs)
-        fv = np.zeros(self.num_clusters, dtype=np.float32)
-
-        for i, item in enumerate(fvs):
-            fv[labels[i]] += 1
+        fv = np.bincount(labels, minlength=self.num_clusters).astype(np.float32)
 
         fv_image = np.reshape(fv, ((1, fv.shape[0])))
         return self.normalize(fv_image)
@@ -99,8 +146,9 @@ class FeatureExtractor(object):
 
         # Extract the centroids from the feature points
 
-    def get_centroids(self, input_map, num_samples_to_fit=10):
-        kps_all = []
+    def get_centroids(self, input_map, num_samples_to_fit=10, workers=None, cache_folder=None, batch_size=1,
+                      max_bytes=256 * 1024 * 1024, checkpoint=None):
+        selected = []
 
         count = 0
         cur_label = ''
@@ -117,13 +165,17 @@ class FeatureExtractor(object):
                 print("Built centroids for", item['label'])
 
             cur_label = item['label']
-            img = cv2.imread(item['image'])
-            img = resize_to_size(img, 150)
+            selected.append(item['image'])
 
-            fvs = self.extract_image_features(img)
-            kps_all.extend(fvs)
+        # Images already in the checkpoint are not extracted again
+        quantizer = Quantizer()
+        trainer = quantizer.codebook_trainer(max_bytes, checkpoint)
+        selected = [path for path in selected if not trainer.procesada(path)]
 
-        kmeans, centroids = Quantizer().quantize(kps_all)
+        # Descriptors stream from the extraction pool into the trainer, with
+        # a bounded number of batches in flight
+        descriptors = extract_descriptors(selected, workers, cache_folder, batch_size=batch_size)
+        kmeans, centroids = quantizer.quantize_stream(descriptors, trainer=trainer)
         return kmeans, centroids
 
     def get_feature_vector(self, img, kmeans, centroids):
@@ -134,10 +186,22 @@ def build_arg_parser():
     parser = argparse.ArgumentParser(description='Creates features for given images')
     parser.add_argument("--samples", dest="cls", nargs="+", action="append", required=True, \
                         help="Folders containing the training images.\nThe first element needs to be the class label.")
-    parser.add_argument("--codebook-file", dest='codebook_file', required=True,
+    parser.add_argument("--codebook-file", dest='codebook_file', required=False,
                         help="Base file name to store the codebook")
-    parser.add_argument("--feature-map-file", dest='feature_map_file', required=True, \
+    parser.add_argument("--feature-map-file", dest='feature_map_file', required=False, \
                         help="Base file name to store the feature map")
+    parser.add_argument("--cache-dir", dest='cache_dir', default=None,
+                        help="Folder for the per-image descriptor cache")
+    parser.add_argument("--workers", dest='workers', type=int, default=None,
+                        help="Feature extraction processes (default: one per core)")
+    parser.add_argument("--batch-size", dest='batch_size', type=int, default=1,
+                        help="Images described per native SIFT compute call")
+    parser.add_argument("--max-memory-mb", dest='max_memory_mb', type=int, default=256,
+                        help="Memory cap for the codebook trainer")
+    parser.add_argument("--checkpoint", dest='checkpoint', default=None,
+                        help="Codebook trainer checkpoint, resumed if it exists")
+    parser.add_argument("--benchmark", dest='benchmark', action='store_true',
+                        help="Only time the extraction stages on the sample images")
 
     return parser
 
@@ -158,22 +222,23 @@ def load_input_map(label, input_folder):
     return combined_data
 
 
-def extract_feature_map(input_map, kmeans, centroids):
+def extract_feature_map(input_map, kmeans, centroids, workers=None, cache_folder=None, batch_size=1):
     feature_map = []
+    quantizer = Quantizer()
 
-    for item in input_map:
+    paths = [item['image'] for item in input_map]
+    descriptors = extract_descriptors(paths, workers, cache_folder, batch_size=batch_size)
+    for item, (path, fvs) in zip(input_map, descriptors):
         temp_dict = {}
         temp_dict['label'] = item['label']
 
         print("Extracting features for", item['image'])
-        img = cv2.imread(item['image'])
         # ✅ Verificar que se haya leído correctamente
-        if img is None:
+        if fvs is None:
             print(f"⚠️ No se pudo leer la imagen: {item['image']}. Saltando...")
             continue
-        img = resize_to_size(img, 150)
 
-        temp_dict['feature_vector'] = FeatureExtractor().get_feature_vector(img, kmeans, centroids)
+        temp_dict['feature_vector'] = quantizer.get_feature_vector_from_descriptors(fvs, kmeans)
 
         if temp_dict['feature_vector'] is not None:
             feature_map.append(temp_dict)
@@ -181,6 +246,151 @@ def extract_feature_map(input_map, kmeans, centroids):
     return feature_map
 
 
+def hash_file(path, block_size=1024 * 1024):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# On-disk cache of dense SIFT descriptors, one .npy per image. The key is the
+# content hash plus everything that changes the descriptors (resize target
+# and dense grid), so renamed or copied images are still hits.
+class DescriptorCache(object):
+    def __init__(self, folder, new_size=150, step_size=20, feature_scale=20, img_bound=20):
+        self.folder = folder
+        self.suffix = "-r%d-g%d_%d_%d.npy" % (new_size, step_size, feature_scale, img_bound)
+        os.makedirs(folder, exist_ok=True)
+
+    def path(self, digest):
+        return os.path.join(self.folder, digest + self.suffix)
+
+    def load(self, digest):
+        path = self.path(digest)
+        if not os.path.exists(path):
+            return None
+        return np.load(path)
+
+    def save(self, digest, descriptors):
+        path = self.path(digest)
+        temp_path = path + ".%d.tmp.npy" % os.getpid()
+        np.save(temp_path, descriptors)
+        os.replace(temp_path, path)
+
+
+# Worker state: one SIFT extractor, detector and cache per process
+_worker = {}
+
+
+def _init_worker(cache_folder, new_size, step_size, feature_scale, img_bound):
+    cv2.setNumThreads(1)
+    _worker['new_size'] = new_size
+    _worker['detector'] = DenseDetector(step_size, feature_scale, img_bound)
+    _worker['extractor'] = SIFTExtractor()
+    _worker['cache'] = None
+    if cache_folder:
+        _worker['cache'] = DescriptorCache(cache_folder, new_size, step_size, feature_scale, img_bound)
+
+
+def _batch_descriptors(paths):
+    # Cache hits are loaded, the rest are decoded and described together
+    # with a single native SIFT compute call
+    cache = _worker['cache']
+    results = []
+    pending = []
+    for path in paths:
+        digest = None
+        if cache is not None:
+            try:
+                digest = hash_file(path)
+            except OSError:
+                results.append((path, None))
+                continue
+            descriptors = cache.load(digest)
+            if descriptors is not None:
+                results.append((path, descriptors))
+                continue
+
+        img = cv2.imread(path)
+        if img is None:
+            results.append((path, None))
+            continue
+        results.append((path, None))
+        pending.append((len(results) - 1, digest, resize_to_size(img, _worker['new_size'])))
+
+    if pending:
+        imgs = [img for _, _, img in pending]
+        kps_list = [_worker['detector'].detect(img) for img in imgs]
+        if len(imgs) == 1:
+            des_list = [_worker['extractor'].compute(imgs[0], kps_list[0])[1]]
+        else:
+            _, des_list = _worker['extractor'].compute_batch(imgs, kps_list)
+        for (index, digest, _), descriptors in zip(pending, des_list):
+            descriptors = np.asarray(descriptors, dtype=np.float32)
+            if cache is not None:
+                cache.save(digest, descriptors)
+            results[index] = (results[index][0], descriptors)
+    return results
+
+
+# Dense SIFT descriptors of every path, in input order, computed across a
+# process pool (None for unreadable images). With batch_size > 1 each task
+# covers that many images and describes them with one compute call. At most
+# 'window' batches (default 2 per worker) are submitted or waiting to be
+# consumed, so a slow consumer does not pile up descriptors in memory
+def extract_descriptors(paths, workers=None, cache_folder=None, new_size=150, step_size=20,
+                        feature_scale=20, img_bound=20, batch_size=1, window=None):
+    if not paths:
+        return
+    workers = workers or os.cpu_count() or 1
+    window = window or 2 * workers
+    in_flight = deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(cache_folder, new_size, step_size, feature_scale, img_bound)) as pool:
+        for i in range(0, len(paths), batch_size):
+            in_flight.append(pool.submit(_batch_descriptors, paths[i:i + batch_size]))
+            if len(in_flight) >= window:
+                for result in in_flight.popleft().result():
+                    yield result
+        while in_flight:
+            for result in in_flight.popleft().result():
+                yield result
+
+
+def _loop_detect(img, step_size=20, feature_scale=20, img_bound=20):
+    # Original per-call double loop, kept only as the benchmark baseline
+    keypoints = []
+    rows, cols = img.shape[:2]
+    for x in range(img_bound, rows, feature_scale):
+        for y in range(img_bound, cols, feature_scale):
+            keypoints.append(cv2.KeyPoint(float(x), float(y), step_size))
+    return keypoints
+
+
+def benchmark_extraction(paths, repeats=5, new_size=150):
+    # ms per image of each stage of the extraction, in a single process
+    imgs = [resize_to_size(img, new_size) for img in map(cv2.imread, paths) if img is not None]
+    detector = DenseDetector()
+    extractor = SIFTExtractor()
+    timings = {}
+
+    def measure(name, function):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            function()
+        timings[name] = 1e3 * (time.perf_counter() - start) / (repeats * len(imgs))
+
+    measure('detect_loop', lambda: [_loop_detect(img) for img in imgs])
+    measure('detect_grid', lambda: [detector.detect(img) for img in imgs])
+    kps_list = [detector.detect(img) for img in imgs]
+    measure('compute_per_image', lambda: [extractor.compute(img, kps) for img, kps in zip(imgs, kps_list)])
+    measure('compute_batch', lambda: extractor.compute_batch(imgs, kps_list))
+    timings['images'] = len(imgs)
+    timings['shapes'] = len(set(img.shape[:2] for img in imgs))
+    return timings
+
+
 # Resize the shorter dimension to 'new_size'
 # while maintaining the aspect ratio
 def resize_to_size(input_image, new_size=150):
@@ -195,7 +405,8 @@ def resize_to_size(input_image, new_size=150):
 
 
 if __name__ == '__main__':
-    args = build_arg_parser().parse_args()
+    parser = build_arg_parser()
+    args = parser.parse_args()
 
     input_map = []
     for cls in args.cls:
@@ -203,9 +414,22 @@ if __name__ == '__main__':
         label = cls[0]
         input_map += load_input_map(label, cls[1])
 
+    if args.benchmark:
+        timings = benchmark_extraction([item['image'] for item in input_map])
+        print("%d images, %d distinct shapes" % (timings['images'], timings['shapes']))
+        for name in ('detect_loop', 'detect_grid', 'compute_per_image', 'compute_batch'):
+            print("%-18s %.3f ms/image" % (name, timings[name]))
+        sys.exit(0)
+    if not args.codebook_file or not args.feature_map_file:
+        parser.error("--codebook-file and --feature-map-file are required")
+
         # Building the codebook
     print("===== Building codebook =====")
-    kmeans, centroids = FeatureExtractor().get_centroids(input_map)
+    kmeans, centroids = FeatureExtractor().get_centroids(input_map, workers=args.workers,
+                                                         cache_folder=args.cache_dir,
+                                                         batch_size=args.batch_size,
+                                                         max_bytes=args.max_memory_mb * 1024 * 1024,
+                                                         checkpoint=args.checkpoint)
     if args.codebook_file:
         with open(args.codebook_file, 'wb') as f:
             print('kmeans', kmeans)
@@ -214,7 +438,8 @@ if __name__ == '__main__':
 
             # Input data and labels
     print("===== Building feature map =====")
-    feature_map = extract_feature_map(input_map, kmeans, centroids)
+    feature_map = extract_feature_map(input_map, kmeans, centroids, args.workers, args.cache_dir,
+                                      args.batch_size)
     if args.feature_map_file:
         with open(args.feature_map_file, 'wb') as f:
             pickle.dump(feature_map, f)
@@ -13,7 +13,33 @@ from PIL import Image
 import tempfile
 import os
 import sys
-import matplotlib.pyplot as plt
+import threading
+
+from temas.modelos import registro_modelos
+from temas.visor import mostrar_imagen
+
+# ✅ Para importar create_features correctamente
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+import create_features as cf
+
+
+class ClasificadorImagen:
+    def __init__(self, ann_file, le_file, codebook_file):
+        self.ann = cv2.ml.ANN_MLP_load(ann_file)
+        with open(le_file, "rb") as f:
+            self.le = pickle.load(f)
+        with open(codebook_file, "rb") as f:
+            self.kmeans, self.centroids = pickle.load(f)
+        # El ANN de OpenCV no se debe usar desde dos hilos a la vez
+        self.lock = threading.Lock()
+
+    def clasificar(self, img):
+        img = cf.resize_to_size(img, 150)
+        feature_vector = cf.FeatureExtractor().get_feature_vector(img, self.kmeans, self.centroids)
+        with self.lock:
+            _, prediction = self.ann.predict(feature_vector)
+        label = self.le.inverse_transform(np.asarray(prediction))
+        return label[0]
 
 # --- Estilos visuales personalizados ---
 def run():
@@ -27,10 +53,6 @@ def run():
         </style>
     """, unsafe_allow_html=True)
 
-    # ✅ Para importar create_features correctamente
-    sys.path.append(os.path.join(os.path.dirname(__file__)))
-    import create_features as cf
-
     # ---- Rutas absolutas de los modelos ----
     BASE_DIR = os.path.dirname(__file__)       # tema11/
     MODEL_DIR = os.path.join(BASE_DIR, "models")
@@ -49,21 +71,9 @@ def run():
         st.error(f"❌ No se encontró el archivo codebook: {CODEBOOK_FILE}")
         return
 
-    # ---- Inicializar el clasificador ----
-    class ClasificadorImagen:
-        def __init__(self, ann_file, le_file, codebook_file):
-            self.ann = cv2.ml.ANN_MLP_load(ann_file)
-            with open(le_file, "rb") as f:
-                self.le = pickle.load(f)
-            with open(codebook_file, "rb") as f:
-                self.kmeans, self.centroids = pickle.load(f)
-
-        def clasificar(self, img):
-            img = cf.resize_to_size(img, 150)
-            feature_vector = cf.FeatureExtractor().get_feature_vector(img, self.kmeans, self.centroids)
-            _, prediction = self.ann.predict(feature_vector)
-            label = self.le.inverse_transform(np.asarray(prediction))
-            return label[0]
+    # ---- Clasificador compartido por todas las sesiones ----
+    clasificador = registro_modelos.obtener((ANN_FILE, LE_FILE, CODEBOOK_FILE), ClasificadorImagen,
+                                            "tema11")
 
     # ---- Interfaz de Streamlit ----
     st.title("🤖 Clasificador Visual - Capítulo 11")
@@ -81,13 +91,9 @@ def run():
         # Abrir imagen con PIL
         image = Image.open(uploaded_file)
         
-        # Mostrar imagen usando matplotlib en lugar de st.image()
-        fig, ax = plt.subplots(figsize=(8, 6))
-        ax.imshow(image)
-        ax.axis('off')
-        ax.set_title("🖼️ Imagen seleccionada", fontsize=14)
-        st.pyplot(fig)
-        plt.close()
+        # Mostrar imagen (JPEG directo, sin pasar por matplotlib)
+        img_bgr = cv2.cvtColor(np.array(image.convert("RGB")), cv2.COLOR_RGB2BGR)
+        mostrar_imagen(img_bgr, "🖼️ Imagen seleccionada")
 
         # --- Guardar la imagen temporalmente con extensión ---
         with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as temp_file:
@@ -98,7 +104,6 @@ def run():
         img_cv = cv2.imread(temp_path)
 
         with st.spinner("🧠 Analizando con la red neuronal..."):
-            clasificador = ClasificadorImagen(ANN_FILE, LE_FILE, CODEBOOK_FILE)
             resultado = clasificador.clasificar(img_cv)
 
         # ---- Traducir el resultado al español ----
@@ -113,3 +118,6 @@ def run():
         # Mostrar resultado con ambos idiomas
         st.success(f"🎯 **Resultado:** {resultado_en} ({resultado_es})")
         st.info("✅ Clasificación completada mediante un modelo ANN entrenado.")
+
+    with st.expander("Modelos en memoria"):
+        st.dataframe(registro_modelos.estadisticas())
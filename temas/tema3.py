@@ -2,7 +2,8 @@ import streamlit as st
 import cv2
 import numpy as np
 from PIL import Image
-import tempfile
+
+from temas.videos import abrir_video
 
 
 def run():
@@ -40,19 +41,14 @@ def run():
     elif opcion == "Extraer frame de video":
         video_file = st.file_uploader("Selecciona un video", type=['mp4', 'avi', 'mov'])
         if video_file:
-            # Guardar temporalmente
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
-            temp_file.write(video_file.read())
-            
-            # Abrir video
-            video = cv2.VideoCapture(temp_file.name)
-            frame_count = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+            # Frames decodificados compartidos entre reruns
+            almacen = abrir_video(video_file)
+            frame_count = almacen.total
             
             # Seleccionar frame
             frame_idx = st.slider("Frame a extraer", 0, frame_count - 1, 0)
-            video.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-            success, frame = video.read()
-            video.release()
+            frame = almacen.frame(frame_idx)
+            success = frame is not None
             
             if success:
                 img_source = frame
@@ -2,7 +2,8 @@ import streamlit as st
 import cv2
 import numpy as np
 from PIL import Image
-import tempfile
+
+from temas.videos import abrir_video
 
 
 def run():
@@ -43,16 +44,12 @@ def run():
     with tipo_entrada[2]:
         archivo_video = st.file_uploader("Sube un video", type=['mp4', 'avi', 'mov', 'mkv'])
         if archivo_video:
-            temp = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
-            temp.write(archivo_video.read())
-            
-            video = cv2.VideoCapture(temp.name)
-            num_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+            almacen = abrir_video(archivo_video)
+            num_frames = almacen.total
             
             frame_seleccionado = st.slider("Frame", 0, num_frames - 1, 0)
-            video.set(cv2.CAP_PROP_POS_FRAMES, frame_seleccionado)
-            exito, frame = video.read()
-            video.release()
+            frame = almacen.frame(frame_seleccionado)
+            exito = frame is not None
             
             if exito:
                 source_img = frame
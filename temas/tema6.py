@@ -4,68 +4,34 @@ import numpy as np
 from PIL import Image
 from io import BytesIO
 
+from temas.seams import ensanchar, reducir_ancho
+
 
 def run():
     # Funciones auxiliares
-    def calcular_energia(imagen):
-        gris = cv2.cvtColor(imagen, cv2.COLOR_BGR2GRAY)
-        grad_x = cv2.Sobel(gris, cv2.CV_64F, 1, 0, ksize=3)
-        grad_y = cv2.Sobel(gris, cv2.CV_64F, 0, 1, ksize=3)
-        abs_x = cv2.convertScaleAbs(grad_x)
-        abs_y = cv2.convertScaleAbs(grad_y)
-        return cv2.addWeighted(abs_x, 0.5, abs_y, 0.5, 0)
-
-    def energia_modificada(imagen, area):
-        matriz_energia = calcular_energia(imagen)
+    def procesar_eliminacion(imagen, area, por_lote=1, restaurar=False, niveles=0,
+                             criterio="sobel"):
+        cantidad_seams = area[2] + 10
         x, y, w, h = area
-        matriz_energia[y:y+h, x:x+w] = 0
-        return matriz_energia
+        mascara = np.zeros(imagen.shape[:2], dtype=bool)
+        mascara[y:y+h, x:x+w] = True
 
-    def buscar_seam_vertical(imagen, energia):
-        filas, columnas = imagen.shape[:2]
-        seam = np.zeros(filas)
-        distancia = np.zeros((filas, columnas)) + float("inf")
-        distancia[0, :] = np.zeros(columnas)
-        camino = np.zeros((filas, columnas))
-
-        for f in range(filas - 1):
-            for c in range(columnas):
-                if c != 0 and distancia[f+1, c-1] > distancia[f, c] + energia[f+1, c-1]:
-                    distancia[f+1, c-1] = distancia[f, c] + energia[f+1, c-1]
-                    camino[f+1, c-1] = 1
-                if distancia[f+1, c] > distancia[f, c] + energia[f+1, c]:
-                    distancia[f+1, c] = distancia[f, c] + energia[f+1, c]
-                    camino[f+1, c] = 0
-                if c != columnas-1 and distancia[f+1, c+1] > distancia[f, c] + energia[f+1, c+1]:
-                    distancia[f+1, c+1] = distancia[f, c] + energia[f+1, c+1]
-                    camino[f+1, c+1] = -1
-
-        seam[filas-1] = np.argmin(distancia[filas-1, :])
-        for i in range(filas-1, 0, -1):
-            seam[i-1] = seam[i] + camino[i, int(seam[i])]
-        return seam
+        # La energía se actualiza solo alrededor de cada seam; la imagen en
+        # color se reconstruye una sola vez al final con el mapa de columnas
+        barra = st.progress(0)
+        resultado, _ = reducir_ancho(imagen, cantidad_seams, mascara, por_lote,
+                                     progreso=barra.progress, niveles=niveles,
+                                     criterio=criterio)
 
-    def eliminar_seam_vertical(imagen, seam):
-        filas, columnas = imagen.shape[:2]
-        for f in range(filas):
-            for c in range(int(seam[f]), columnas-1):
-                imagen[f, c] = imagen[f, c+1]
-        return imagen[:, 0:columnas-1]
+        # Volver al ancho original duplicando los seams de menor energía
+        if restaurar:
+            barra.progress(0)
+            resultado = ensanchar(resultado, cantidad_seams, por_lote,
+                                  progreso=barra.progress, niveles=niveles,
+                                  criterio=criterio)
 
-    def procesar_eliminacion(imagen, area):
-        cantidad_seams = area[2] + 10
-        energia = energia_modificada(imagen, area)
-        barra = st.progress(0)
-        
-        for idx in range(cantidad_seams):
-            seam = buscar_seam_vertical(imagen, energia)
-            imagen = eliminar_seam_vertical(imagen, seam)
-            x, y, w, h = area
-            energia = energia_modificada(imagen, (x, y, max(1, w-idx), h))
-            barra.progress((idx + 1) / cantidad_seams)
-        
         barra.empty()
-        return imagen
+        return resultado
 
     # Interfaz
     st.title("✂️ Eliminación de Objetos con Seam Carving")
@@ -101,6 +67,16 @@ def run():
             tam_w = st.slider("Ancho", 10, ancho - pos_x, min(100, ancho - pos_x))
             tam_h = st.slider("Alto", 10, alto - pos_y, min(100, alto - pos_y))
 
+        c3, c4 = st.columns(2)
+        with c3:
+            por_lote = st.slider("Seams por lote", 1, 20, 1)
+        with c4:
+            # 0 = exacto; cada nivel reduce a la mitad la resolución de búsqueda
+            niveles = st.slider("Velocidad (niveles de pirámide)", 0, 3, 0)
+        criterios = {"Sobel (hacia atrás)": "sobel", "Energía hacia adelante": "adelante"}
+        criterio = criterios[st.selectbox("Criterio de energía", list(criterios))]
+        restaurar = st.checkbox("Recuperar ancho original", value=False)
+
         # Vista previa
         area_seleccionada = (int(pos_x), int(pos_y), int(tam_w), int(tam_h))
         img_preview = img_array.copy()
@@ -111,7 +87,8 @@ def run():
         if st.button("Eliminar objeto", type="primary"):
             with st.spinner("Procesando..."):
                 img_copia = img_array.copy()
-                resultado = procesar_eliminacion(img_copia, area_seleccionada)
+                resultado = procesar_eliminacion(img_copia, area_seleccionada, por_lote, restaurar,
+                                                 niveles, criterio)
                 resultado_rgb = cv2.cvtColor(resultado, cv2.COLOR_BGR2RGB)
                 
                 st.divider()
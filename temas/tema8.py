@@ -1,10 +1,13 @@
 import streamlit as st
 import cv2
 import numpy as np
-import tempfile
 from PIL import Image
 import io
 
+from temas.flujo import METODOS_DENSOS, TrabajoFlujo
+from temas.videos import abrir_video
+from temas.visor import mostrar_imagen
+
 
 def run():
     st.title("🎯 Seguimiento por Flujo Óptico")
@@ -12,139 +15,168 @@ def run():
     video_file = st.file_uploader("Sube un video", type=['mp4', 'avi', 'mov', 'mkv'])
 
     if video_file:
-        # Guardar temporalmente
-        temp = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
-        temp.write(video_file.read())
-        ruta_video = temp.name
-        
-        # Info del video
-        video = cv2.VideoCapture(ruta_video)
-        total = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
-        fps_video = int(video.get(cv2.CAP_PROP_FPS))
-        video.release()
+        # Info del video (frames compartidos entre reruns)
+        almacen = abrir_video(video_file)
+        total = almacen.total
+        fps_video = int(almacen.fps)
         
         st.info(f"Video cargado: {total} frames, {fps_video} FPS")
         
         # Configuración
         st.subheader("Configuración")
         
+        modos = {"lk": "Trayectorias (Lucas-Kanade)"}
+        modos.update(METODOS_DENSOS)
+        modo = st.selectbox("Modo", list(modos), format_func=modos.get)
+        
         c1, c2 = st.columns(2)
-        with c1:
-            escala = st.slider("Escala", 0.2, 1.0, 0.4, 0.1)
-            seguimiento = st.slider("Frames por trayectoria", 3, 15, 7)
-        with c2:
-            salto = st.slider("Intervalo de detección", 1, 8, 3)
-            limite_frames = st.slider("Frames a procesar", 20, min(total, 200), min(80, total))
+        if modo == "lk":
+            with c1:
+                escala = st.slider("Escala", 0.2, 1.0, 0.4, 0.1)
+                seguimiento = st.slider("Frames por trayectoria", 3, 15, 7)
+            with c2:
+                salto = st.slider("Intervalo de detección", 1, 8, 3)
+                limite_frames = st.slider("Frames a procesar", 20, min(total, 200), min(80, total))
+            
+            # Las esquinas nuevas se reparten en una rejilla de 8x6 celdas
+            objetivo = st.slider("Trayectorias objetivo", 200, 3000, 1200, 100)
+            ajustes = (seguimiento, salto, objetivo)
+        else:
+            with c1:
+                escala = st.slider("Escala", 0.2, 1.0, 0.4, 0.1)
+                limite_frames = st.slider("Frames a procesar", 20, min(total, 200), min(80, total))
+            with c2:
+                # 0 normaliza el brillo por frame
+                maximo = st.slider("Magnitud para brillo máximo (px)", 0.0, 20.0, 0.0, 0.5)
+                mostrar_regiones = st.checkbox("Resumen por regiones (4x3)", value=True)
+            ajustes = (maximo, mostrar_regiones)
         
-        # Parámetros LK
-        params_lk = dict(
-            winSize=(15, 15),
-            maxLevel=3,
-            criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 15, 0.02)
-        )
+        # Parámetros que cambian la salida: mientras no cambien, el trabajo
+        # guardado en la sesión (en curso o terminado) sobrevive a los reruns
+        clave = (almacen.hash, modo, escala, limite_frames) + ajustes
+        trabajo = st.session_state.get("flujo_optico")
         
         if st.button("Procesar video", type="primary"):
-            with st.spinner("Procesando..."):
-                video = cv2.VideoCapture(ruta_video)
-                
-                trayectorias = []
-                idx_frame = 0
-                gris_anterior = None
-                resultado_frames = []
-                
-                barra = st.progress(0)
-                
-                while idx_frame < limite_frames:
-                    ok, cuadro = video.read()
-                    if not ok:
-                        break
-                    
-                    # Escalar
-                    cuadro = cv2.resize(cuadro, None, fx=escala, fy=escala, 
-                                       interpolation=cv2.INTER_AREA)
-                    cuadro_gris = cv2.cvtColor(cuadro, cv2.COLOR_BGR2GRAY)
-                    salida = cuadro.copy()
-                    
-                    # Seguimiento
-                    if len(trayectorias) > 0 and gris_anterior is not None:
-                        pts_actuales = [t[-1] for t in trayectorias]
-                        pts0 = np.float32(pts_actuales).reshape(-1, 1, 2)
-                        
-                        pts1, estado, _ = cv2.calcOpticalFlowPyrLK(
-                            gris_anterior, cuadro_gris, pts0, None, **params_lk
-                        )
-                        
-                        pts0_rev, _, _ = cv2.calcOpticalFlowPyrLK(
-                            cuadro_gris, gris_anterior, pts1, None, **params_lk
-                        )
-                        
-                        diferencia = abs(pts0 - pts0_rev).reshape(-1, 2).max(-1)
-                        puntos_buenos = diferencia < 1.5
-                        
-                        nuevas_trayectorias = []
-                        for traj, (x, y), bueno in zip(trayectorias, 
-                                                       pts1.reshape(-1, 2), 
-                                                       puntos_buenos):
-                            if not bueno:
-                                continue
-                            traj.append((x, y))
-                            if len(traj) > seguimiento:
-                                del traj[0]
-                            nuevas_trayectorias.append(traj)
-                            cv2.circle(salida, (int(x), int(y)), 4, (255, 0, 0), -1)
-                        
-                        trayectorias = nuevas_trayectorias
-                        rutas = [np.int32(t) for t in trayectorias]
-                        cv2.polylines(salida, rutas, False, (0, 255, 255), 2)
-                    
-                    # Detectar nuevos puntos
-                    if idx_frame % salto == 0:
-                        mascara = np.zeros_like(cuadro_gris)
-                        mascara[:] = 255
-                        for x, y in [np.int32(t[-1]) for t in trayectorias]:
-                            cv2.circle(mascara, (x, y), 8, 0, -1)
-                        
-                        caracteristicas = cv2.goodFeaturesToTrack(
-                            cuadro_gris, mask=mascara, maxCorners=400, 
-                            qualityLevel=0.25, minDistance=10, blockSize=5
-                        )
-                        
-                        if caracteristicas is not None:
-                            for x, y in np.float32(caracteristicas).reshape(-1, 2):
-                                trayectorias.append([(x, y)])
-                    
-                    # Info en frame
-                    cv2.putText(salida, f"F: {idx_frame + 1}", (15, 35),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-                    cv2.putText(salida, f"T: {len(trayectorias)}", (15, 70),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-                    
-                    resultado_frames.append(salida)
-                    gris_anterior = cuadro_gris
-                    idx_frame += 1
-                    
-                    barra.progress(idx_frame / limite_frames)
-                
-                video.release()
-                barra.empty()
-                st.success(f"Procesados {len(resultado_frames)} frames")
-                
-                # Visualizar
-                st.subheader("Resultado")
-                
-                selector = st.slider("Frame", 0, len(resultado_frames) - 1, 0)
-                frame_rgb = cv2.cvtColor(resultado_frames[selector], cv2.COLOR_BGR2RGB)
-                st.image(frame_rgb, caption=f"Frame {selector + 1}")
-                
-                # Descarga
-                _, buffer = cv2.imencode('.png', resultado_frames[selector])
-                st.download_button(
-                    "Descargar frame",
-                    data=buffer.tobytes(),
-                    file_name=f"flujo_optico_{selector}.png",
-                    mime="image/png"
-                )
+            if trabajo is not None:
+                trabajo.descartar()
+            if modo == "lk":
+                trabajo = TrabajoFlujo(almacen, clave, modo, escala, limite_frames, historia=seguimiento,
+                                       salto=salto, objetivo=objetivo)
+            else:
+                trabajo = TrabajoFlujo(almacen, clave, modo, escala, limite_frames,
+                                       maximo=maximo or None, mostrar_regiones=mostrar_regiones)
+            st.session_state["flujo_optico"] = trabajo.iniciar()
+        
+        if trabajo is None:
+            return
+        if trabajo.clave != clave:
+            # El trabajo viejo se detiene (no se descarta): si se vuelven a
+            # poner los parámetros anteriores se puede reanudar
+            if trabajo.en_curso:
+                trabajo.cancelar()
+            st.info("Los parámetros cambiaron: vuelve a procesar el video")
+            return
+        
+        if trabajo.error is not None:
+            st.error(f"Error al procesar: {trabajo.error}")
+        if trabajo.en_curso:
+            progreso_trabajo(trabajo)
+        elif not trabajo.terminado:
+            st.progress(trabajo.progreso, text=f"Detenido en {trabajo.siguiente}/{trabajo.limite_frames}")
+            if st.button("Reanudar"):
+                trabajo.iniciar()
+                st.rerun()
+        mostrar_resultado(trabajo)
+
+
+@st.fragment(run_every=1.0)
+def progreso_trabajo(trabajo):
+    # Solo este bloque se refresca mientras el hilo procesa; al terminar o
+    # cancelar se vuelve a dibujar la página completa
+    if not trabajo.en_curso:
+        st.rerun()
+    
+    st.progress(trabajo.progreso, text=f"Procesando... {trabajo.siguiente}/{trabajo.limite_frames}")
+    if st.button("Cancelar"):
+        trabajo.cancelar()
+        st.rerun()
+    
+    ultimo = len(trabajo.grabador) - 1
+    if ultimo >= 0:
+        st.image(trabajo.grabador.miniatura(ultimo), caption=f"Frame {ultimo + 1}")
+
+
+def mostrar_resultado(trabajo):
+    grabador = trabajo.grabador
+    if len(grabador) == 0:
+        return
+    if trabajo.terminado:
+        st.success(f"Procesados {len(grabador)} frames")
+    
+    # Visualizar (mientras se procesa, solo las miniaturas)
+    st.subheader("Resultado")
+    
+    selector = st.slider("Frame", 0, max(1, len(grabador) - 1), 0)
+    selector = min(selector, len(grabador) - 1)
+    frame = grabador.frame(selector)
+    if frame is None:
+        st.image(grabador.miniatura(selector), caption=f"Frame {selector + 1}")
+    else:
+        mostrar_imagen(frame, f"Frame {selector + 1}")
+        
+        # Descarga
+        _, buffer = cv2.imencode('.png', frame)
+        st.download_button(
+            "Descargar frame",
+            data=buffer.tobytes(),
+            file_name=f"flujo_optico_{selector}.png",
+            mime="image/png"
+        )
+    
+    # Tiempo por frame (seguimiento o flujo denso, sin decodificar ni grabar)
+    tiempos = np.asarray(trabajo.tiempos[1:])
+    if len(tiempos):
+        st.caption(f"Tiempo por frame: media {tiempos.mean():.1f} ms, "
+                   f"p95 {np.percentile(tiempos, 95):.1f} ms, máximo {tiempos.max():.1f} ms")
+        st.line_chart(tiempos)
+    
+    regiones = trabajo.regiones()
+    if regiones is not None:
+        st.write("Magnitud media del flujo por región (px/frame)")
+        st.dataframe(np.round(regiones, 2))
+    
+    with st.expander("Índice de miniaturas"):
+        paso = max(1, len(grabador) // 24)
+        indices = list(range(0, len(grabador), paso))
+        st.image([grabador.miniatura(i) for i in indices],
+                 caption=[f"{i + 1}" for i in indices], width=120)
+    
+    if not trabajo.terminado:
+        return
+    
+    # Video anotado completo
+    st.download_button(
+        "Descargar video",
+        data=grabador.datos(),
+        file_name="flujo_optico.mp4",
+        mime="video/mp4"
+    )
+    
+    exportado = trabajo.exportar()
+    if exportado is None:
+        return
+    
+    # Trayectorias activas al final, para analizarlas fuera
+    ids, rutas = exportado
+    datos = io.BytesIO()
+    np.savez_compressed(datos, ids=ids, trayectorias=rutas)
+    st.download_button(
+        "Descargar trayectorias",
+        data=datos.getvalue(),
+        file_name="trayectorias.npz",
+        mime="application/octet-stream"
+    )
 
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    run()
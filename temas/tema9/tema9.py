@@ -1,11 +1,19 @@
 import os
 import cv2
-import pickle
 import numpy as np
 import streamlit as st
 from sklearn.preprocessing import StandardScaler
 from scipy.spatial.distance import cdist
-import matplotlib.pyplot as plt
+
+from temas.modelos import cargar_pickle, registro_modelos
+from temas.visor import mostrar_imagen
+
+
+def cargar_modelos(codebook_path, svm_path):
+    kmeans, scaler = cargar_pickle(codebook_path)
+    svm, label_names = cargar_pickle(svm_path)
+    return kmeans, scaler, svm, label_names
+
 
 def run():
     st.title("👗👟 Reconocimiento de prendas (Dress vs Footwear)")
@@ -29,13 +37,13 @@ def run():
         st.warning("⚠️ No se encontraron los archivos del modelo entrenado. Ejecuta `train.py` primero.")
         st.stop()
     
-    # --- Cargar modelos ---
-    with open(codebook_path, "rb") as f:
-        kmeans, scaler = pickle.load(f)
-    with open(svm_path, "rb") as f:
-        svm, label_names = pickle.load(f)
+    # --- Cargar modelos (una vez por proceso, compartidos entre sesiones) ---
+    kmeans, scaler, svm, label_names = registro_modelos.obtener(
+        (codebook_path, svm_path), cargar_modelos, "tema9")
     
     st.success("✅ Modelos cargados correctamente.")
+    with st.expander("Modelos en memoria"):
+        st.dataframe(registro_modelos.estadisticas())
     
     # --- Subir imagen ---
     uploaded_file = st.file_uploader("📤 Sube una imagen (JPG o PNG)", type=["jpg", "jpeg", "png"])
@@ -46,14 +54,8 @@ def run():
         image = cv2.imdecode(file_bytes, 1)
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         
-        # Mostrar imagen usando matplotlib
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        fig, ax = plt.subplots(figsize=(8, 6))
-        ax.imshow(image_rgb)
-        ax.axis('off')
-        ax.set_title("Imagen cargada", fontsize=14)
-        st.pyplot(fig)
-        plt.close()
+        # Mostrar imagen (JPEG directo, sin pasar por matplotlib)
+        mostrar_imagen(image, "Imagen cargada")
         
         # --- Extracción de características ---
         sift = cv2.SIFT_create()
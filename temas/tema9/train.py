@@ -1,24 +1,26 @@
 import os
+import sys
 import cv2
 import pickle
 import numpy as np
-from sklearn.cluster import KMeans
 from sklearn.svm import SVC
 from sklearn.preprocessing import StandardScaler
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from temas.codebook import EntrenadorCodebook
+
 # --- CONFIGURACIÓN ---
 DATASET_DIR = os.path.join(os.path.dirname(__file__), "images")
 MODEL_DIR = os.path.join(os.path.dirname(__file__), "models")
 os.makedirs(MODEL_DIR, exist_ok=True)
+# Memoria máxima para los descriptores del diccionario
+MAX_MEMORIA = 256 * 1024 * 1024
 
-# --- EXTRACCIÓN DE DESCRIPTORES ---
+# --- IMÁGENES ---
 sift = cv2.SIFT_create()
-descriptors_list = []
-labels = []
+imagenes = []
 label_names = []
 
-print("🔍 Extrayendo características...")
-
 for label, folder in enumerate(os.listdir(DATASET_DIR)):
     path = os.path.join(DATASET_DIR, folder)
     if not os.path.isdir(path):
@@ -26,32 +28,40 @@ for label, folder in enumerate(os.listdir(DATASET_DIR)):
     label_names.append(folder)
 
     for file in os.listdir(path):
-        img_path = os.path.join(path, file)
-        img = cv2.imread(img_path)
-        if img is None:
-            continue
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        _, desc = sift.detectAndCompute(gray, None)
-        if desc is not None:
-            descriptors_list.append(desc)
-            labels.append(label)
+        imagenes.append((os.path.join(path, file), label))
+
 
-# --- UNIR DESCRIPTORES ---
-all_descriptors = np.vstack(descriptors_list)
-print(f"Total de descriptores: {all_descriptors.shape[0]}")
+def descriptores(img_path):
+    img = cv2.imread(img_path)
+    if img is None:
+        return None
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    _, desc = sift.detectAndCompute(gray, None)
+    return desc
 
-# --- CREAR DICCIONARIO VISUAL ---
+
+# --- CREAR DICCIONARIO VISUAL (en streaming, memoria acotada) ---
 k = 60
-print("🧱 Creando diccionario visual (KMeans)...")
-kmeans = KMeans(n_clusters=k, random_state=42)
-kmeans.fit(all_descriptors)
+print("🔍 Extrayendo características y creando diccionario visual (MiniBatchKMeans)...")
+# Si se interrumpe, la próxima ejecución sigue desde el checkpoint
+CHECKPOINT = os.path.join(MODEL_DIR, "codebook.checkpoint")
+entrenador = EntrenadorCodebook(k, max_bytes=MAX_MEMORIA, semilla=42, checkpoint=CHECKPOINT)
+# Las imágenes que ya están en el checkpoint no se vuelven a extraer
+kmeans = entrenador.entrenar((img_path, descriptores(img_path)) for img_path, _ in imagenes
+                             if not entrenador.procesada(img_path))
+print(f"Total de descriptores: {entrenador.vistos}")
 
-# --- HISTOGRAMAS ---
+# --- HISTOGRAMAS (segunda pasada, sin guardar los descriptores) ---
 features = []
-for desc in descriptors_list:
+labels = []
+for img_path, label in imagenes:
+    desc = descriptores(img_path)
+    if desc is None:
+        continue
     words = kmeans.predict(desc)
     hist, _ = np.histogram(words, bins=np.arange(k + 1))
     features.append(hist)
+    labels.append(label)
 
 features = np.array(features)
 scaler = StandardScaler().fit(features)
@@ -69,4 +79,5 @@ with open(os.path.join(MODEL_DIR, "codebook.pkl"), "wb") as f:
 with open(os.path.join(MODEL_DIR, "svm.pkl"), "wb") as f:
     pickle.dump((svm, label_names), f)
 
+os.remove(CHECKPOINT)
 print("✅ Modelos guardados correctamente en /models/")
@@ -0,0 +1,548 @@
+import argparse
+import atexit
+import hashlib
+import itertools
+import os
+import queue
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+# Carpeta común para los videos subidos: un archivo por contenido (hash),
+# así el mismo video no se vuelve a escribir en cada rerun ni por cada tema.
+CARPETA_VIDEOS = os.path.join(tempfile.gettempdir(), "trabajo_libro_videos")
+# Índices y otros archivos derivados, guardados por hash del video
+CARPETA_INDICES = os.path.join(CARPETA_VIDEOS, "indices")
+MAX_ARCHIVOS = 8
+MAX_ALMACENES = 4
+# Salidas procesadas (GrabadorVideo) que se conservan en CARPETA_INDICES
+MAX_SALIDAS = 8
+# Memoria para frames decodificados, entre todos los almacenes del proceso
+MAX_BYTES_FRAMES = 256 * 1024 * 1024
+
+_lock = threading.Lock()
+_hashes = {}
+_almacenes = OrderedDict()
+# Almacenes vivos, estén o no en `_almacenes`: uno desalojado puede seguir
+# en uso por otra sesión o un hilo de fondo y su video no debe borrarse
+_vivos = weakref.WeakSet()
+_creados = set()
+_grabadores = weakref.WeakSet()
+
+
+def hash_archivo(archivo):
+    # Streamlit entrega el mismo file_id mientras el archivo no cambie,
+    # así que el hash solo se calcula una vez por subida
+    clave = getattr(archivo, "file_id", None)
+    if clave is not None and clave in _hashes:
+        return _hashes[clave]
+    digest = hashlib.sha1(archivo.getvalue()).hexdigest()
+    if clave is not None:
+        _hashes[clave] = digest
+    return digest
+
+
+def hash_ruta(ruta, bloque=1024 * 1024):
+    digest = hashlib.sha1()
+    with open(ruta, "rb") as f:
+        for parte in iter(lambda: f.read(bloque), b""):
+            digest.update(parte)
+    return digest.hexdigest()
+
+
+def ruta_derivada(digest, nombre):
+    # Archivo auxiliar (sidecar) ligado al contenido de un video
+    os.makedirs(CARPETA_INDICES, exist_ok=True)
+    return os.path.join(CARPETA_INDICES, digest + "." + nombre)
+
+
+def guardar_video(archivo):
+    digest = hash_archivo(archivo)
+    sufijo = os.path.splitext(getattr(archivo, "name", ""))[1] or ".mp4"
+    ruta = os.path.join(CARPETA_VIDEOS, digest + sufijo.lower())
+
+    with _lock:
+        if not os.path.exists(ruta):
+            os.makedirs(CARPETA_VIDEOS, exist_ok=True)
+            temporal = ruta + ".parcial"
+            with open(temporal, "wb") as f:
+                f.write(archivo.getvalue())
+            os.replace(temporal, ruta)
+            _creados.add(ruta)
+            _limpiar_archivos(conservar=ruta)
+    return ruta, digest
+
+
+def _limpiar_archivos(conservar):
+    # Borra los videos más viejos que no estén abiertos por ningún almacén
+    en_uso = {almacen.ruta for almacen in list(_vivos)} | {conservar}
+    archivos = [os.path.join(CARPETA_VIDEOS, nombre) for nombre in os.listdir(CARPETA_VIDEOS)]
+    archivos = [a for a in archivos if os.path.isfile(a) and not a.endswith(".parcial")]
+    archivos = sorted(archivos, key=os.path.getmtime)
+    for ruta in archivos[:max(0, len(archivos) - MAX_ARCHIVOS)]:
+        if ruta not in en_uso:
+            _borrar(ruta)
+
+
+def _limpiar_salidas(conservar):
+    # Misma política para las salidas de GrabadorVideo: quedan las
+    # MAX_SALIDAS más recientes, salvo las de grabadores todavía vivos. Las
+    # de sesiones abandonadas se borran aunque el proceso siga corriendo.
+    en_uso = {grabador.ruta for grabador in list(_grabadores)} | {conservar}
+    extension = os.path.splitext(conservar)[1]
+    carpeta = os.path.dirname(conservar)
+    archivos = [os.path.join(carpeta, nombre) for nombre in os.listdir(carpeta)
+                if nombre.endswith(extension)]
+    archivos = [a for a in archivos if os.path.isfile(a) and a not in en_uso]
+    archivos = sorted(archivos, key=os.path.getmtime)
+    for ruta in archivos[:max(0, len(archivos) - MAX_SALIDAS)]:
+        _borrar(ruta)
+
+
+def _borrar(ruta):
+    try:
+        os.remove(ruta)
+    except OSError:
+        pass
+    _creados.discard(ruta)
+
+
+@atexit.register
+def _limpiar_al_salir():
+    for almacen in list(_vivos):
+        almacen.cerrar()
+    for ruta in list(_creados):
+        _borrar(ruta)
+
+
+class CacheFrames(object):
+    # LRU de frames decodificados acotado en bytes y compartido por todos
+    # los almacenes, así el tope vale para el proceso y no por video. Las
+    # claves son (dueño, índice); cada almacén tiene su propio dueño.
+    def __init__(self, max_bytes=MAX_BYTES_FRAMES):
+        self.max_bytes = max_bytes
+        self._frames = OrderedDict()
+        self._bytes = 0
+        self._por_dueno = {}
+        self._duenos = itertools.count()
+        self._lock = threading.Lock()
+
+    def nuevo_dueno(self):
+        return next(self._duenos)
+
+    def obtener(self, dueno, idx):
+        with self._lock:
+            frame = self._frames.get((dueno, idx))
+            if frame is not None:
+                self._frames.move_to_end((dueno, idx))
+            return frame
+
+    def guardar(self, dueno, idx, frame):
+        with self._lock:
+            clave = (dueno, idx)
+            if clave in self._frames:
+                return
+            self._frames[clave] = frame
+            self._sumar(dueno, frame.nbytes)
+            while self._bytes > self.max_bytes and len(self._frames) > 1:
+                (viejo, _), descartado = self._frames.popitem(last=False)
+                self._sumar(viejo, -descartado.nbytes)
+
+    def _sumar(self, dueno, nbytes):
+        self._bytes += nbytes
+        restante = self._por_dueno.get(dueno, 0) + nbytes
+        if restante:
+            self._por_dueno[dueno] = restante
+        else:
+            self._por_dueno.pop(dueno, None)
+
+    def olvidar(self, dueno):
+        with self._lock:
+            for clave in [c for c in self._frames if c[0] == dueno]:
+                self._sumar(dueno, -self._frames.pop(clave).nbytes)
+
+    def estadisticas(self, dueno=None):
+        with self._lock:
+            if dueno is None:
+                return {"frames": len(self._frames), "bytes": self._bytes}
+            return {"frames": sum(1 for c in self._frames if c[0] == dueno),
+                    "bytes": self._por_dueno.get(dueno, 0)}
+
+
+# Cache compartida por todo el proceso
+cache_frames = CacheFrames()
+
+
+def abrir_video(archivo):
+    # Un almacén por contenido, compartido entre reruns y temas
+    ruta, digest = guardar_video(archivo)
+    with _lock:
+        almacen = _almacenes.get(digest)
+        if almacen is None:
+            almacen = AlmacenFrames(ruta)
+            almacen._hash = digest
+            _almacenes[digest] = almacen
+            # Desalojar solo lo saca del registro; la captura se libera
+            # cuando el último que lo usa lo suelta (recolección de basura)
+            while len(_almacenes) > MAX_ALMACENES:
+                _almacenes.popitem(last=False)
+        _almacenes.move_to_end(digest)
+    return almacen
+
+
+class AlmacenFrames(object):
+    # Frames decodificados de un video, guardados en un CacheFrames (por
+    # defecto el del proceso). Solo los pedidos sueltos (sliders) entran a
+    # la cache; los recorridos secuenciales la consultan pero no la llenan.
+    # Los saltos hacia atrás o lejanos se alinean al inicio del grupo de
+    # `intervalo_clave` frames (aproximación del GOP, OpenCV no expone los
+    # keyframes) y se avanza desde ahí; los avances cortos se decodifican
+    # sin volver a buscar en el contenedor.
+    def __init__(self, ruta, intervalo_clave=None, cache=None):
+        self.ruta = ruta
+        self._hash = None
+        self.cache = cache_frames if cache is None else cache
+        self._dueno = self.cache.nuevo_dueno()
+        # Los frames de un almacén que ya nadie usa salen de la cache
+        weakref.finalize(self, self.cache.olvidar, self._dueno)
+        self.captura = cv2.VideoCapture(ruta)
+        self.total = int(self.captura.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.fps = self.captura.get(cv2.CAP_PROP_FPS)
+        self.ancho = int(self.captura.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.alto = int(self.captura.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        if intervalo_clave is None:
+            intervalo_clave = max(1, int(round(self.fps or 0)) or 12)
+        self.intervalo_clave = intervalo_clave
+
+        self._posicion = 0
+        self._lock = threading.RLock()
+        self.aciertos = 0
+        self.fallos = 0
+        _vivos.add(self)
+
+    @property
+    def hash(self):
+        if self._hash is None:
+            self._hash = hash_ruta(self.ruta)
+        return self._hash
+
+    def abierto(self):
+        return self.captura is not None and self.captura.isOpened()
+
+    def cerrar(self):
+        with self._lock:
+            if self.captura is not None:
+                self.captura.release()
+                self.captura = None
+            self.cache.olvidar(self._dueno)
+
+    def _buscar(self, idx):
+        if idx < self._posicion or idx - self._posicion > self.intervalo_clave:
+            destino = idx - idx % self.intervalo_clave
+            self.captura.set(cv2.CAP_PROP_POS_FRAMES, destino)
+            self._posicion = destino
+
+    def frame(self, idx, guardar=True):
+        # Devuelve el frame en solo lectura (o None si no se puede leer);
+        # quien lo quiera modificar debe copiarlo. Con guardar=False el
+        # frame leído no entra a la cache
+        with self._lock:
+            frame = self.cache.obtener(self._dueno, idx)
+            if frame is not None:
+                self.aciertos += 1
+                return frame
+            self.fallos += 1
+            if not self.abierto():
+                return None
+
+            # Los frames intermedios solo se avanzan con grab(), sin
+            # convertirlos a BGR
+            self._buscar(idx)
+            while self._posicion < idx:
+                if not self.captura.grab():
+                    self._posicion = idx + 1
+                    return None
+                self._posicion += 1
+
+            ok, frame = self.captura.read()
+            if not ok:
+                # Fin del video: cualquier pedido anterior vuelve a buscar
+                self._posicion = idx + 1
+                return None
+            self._posicion += 1
+            frame.flags.writeable = False
+            if guardar:
+                self.cache.guardar(self._dueno, idx, frame)
+            return frame
+
+    def frames(self, inicio=0, fin=None, paso=1):
+        # Recorrido secuencial; reutiliza lo que ya esté en memoria pero no
+        # guarda lo que decodifica, así no desaloja los frames de los sliders
+        if self.total > 0:
+            fin = self.total if fin is None else min(fin, self.total)
+        indices = itertools.count(inicio, paso) if fin is None else range(inicio, fin, paso)
+        for idx in indices:
+            frame = self.frame(idx, guardar=False)
+            if frame is None:
+                return
+            yield idx, frame
+
+    def estadisticas(self):
+        estadisticas = self.cache.estadisticas(self._dueno)
+        with self._lock:
+            estadisticas.update(aciertos=self.aciertos, fallos=self.fallos)
+        return estadisticas
+
+
+class LectorFrames(object):
+    # Productor en segundo plano: decodifica, escala y convierte a gris
+    # mientras el hilo principal procesa el frame anterior. La cola acotada
+    # evita que el decodificador se adelante demasiado. `paso` salta frames
+    # en el decodificador (grab sin convertir) en lugar de leerlos y tirarlos.
+    # `fuente` puede ser un AlmacenFrames o la ruta de un video.
+    _FIN = object()
+
+    def __init__(self, fuente, inicio=0, fin=None, paso=1, tamano=None, escala=None,
+                 interpolacion=cv2.INTER_LINEAR, gris=True, capacidad=8):
+        self.fuente = fuente
+        self.inicio = inicio
+        self.fin = fin
+        self.paso = max(1, paso)
+        self.tamano = tamano
+        self.escala = escala
+        self.interpolacion = interpolacion
+        self.gris = gris
+        self._cola = queue.Queue(maxsize=capacidad)
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def _origen(self):
+        if isinstance(self.fuente, AlmacenFrames):
+            yield from self.fuente.frames(self.inicio, self.fin, self.paso)
+            return
+
+        captura = cv2.VideoCapture(self.fuente)
+        try:
+            if self.inicio:
+                captura.set(cv2.CAP_PROP_POS_FRAMES, self.inicio)
+            idx = self.inicio
+            while self.fin is None or idx < self.fin:
+                ok, frame = captura.read()
+                if not ok:
+                    return
+                yield idx, frame
+                for _ in range(self.paso - 1):
+                    if not captura.grab():
+                        return
+                idx += self.paso
+        finally:
+            captura.release()
+
+    def _preparar(self, frame):
+        if self.tamano is not None:
+            frame = cv2.resize(frame, self.tamano, interpolation=self.interpolacion)
+        elif self.escala is not None and self.escala != 1:
+            frame = cv2.resize(frame, None, fx=self.escala, fy=self.escala,
+                               interpolation=self.interpolacion)
+        gris = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if self.gris else None
+        return frame, gris
+
+    def _poner(self, elemento):
+        while not self._detener.is_set():
+            try:
+                self._cola.put(elemento, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _producir(self):
+        try:
+            for idx, frame in self._origen():
+                cuadro, gris = self._preparar(frame)
+                if not self._poner((idx, cuadro, gris)):
+                    return
+            self._poner(self._FIN)
+        except Exception as error:
+            self._poner(error)
+
+    def iniciar(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._producir, daemon=True)
+            self._hilo.start()
+        return self
+
+    def detener(self):
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *args):
+        self.detener()
+
+    def __iter__(self):
+        # Entrega (índice, frame BGR escalado, gris o None)
+        self.iniciar()
+        try:
+            while True:
+                elemento = self._cola.get()
+                if elemento is self._FIN:
+                    return
+                if isinstance(elemento, Exception):
+                    raise elemento
+                yield elemento
+        finally:
+            self.detener()
+
+
+class GrabadorVideo(object):
+    # Salida procesada escrita a un MP4 a medida que se genera. En memoria
+    # solo queda una miniatura JPEG por frame; los frames completos se
+    # recuperan buscando en el archivo una vez cerrado.
+    def __init__(self, ruta, fps, ancho_miniatura=160, calidad_miniatura=70, codec="mp4v"):
+        self.ruta = ruta
+        self.fps = fps or 25.0
+        self.ancho_miniatura = ancho_miniatura
+        self.calidad_miniatura = calidad_miniatura
+        self.codec = codec
+        self.miniaturas = []
+        self._escritor = None
+        self._almacen = None
+        self._lock = threading.Lock()
+        with _lock:
+            _creados.add(ruta)
+            if os.path.dirname(os.path.abspath(ruta)) == os.path.abspath(CARPETA_INDICES):
+                _limpiar_salidas(conservar=ruta)
+            _grabadores.add(self)
+
+    def __len__(self):
+        return len(self.miniaturas)
+
+    def escribir(self, frame):
+        with self._lock:
+            if self._escritor is None:
+                alto, ancho = frame.shape[:2]
+                self._escritor = cv2.VideoWriter(self.ruta, cv2.VideoWriter_fourcc(*self.codec),
+                                                 self.fps, (ancho, alto))
+            self._escritor.write(frame)
+
+            factor = self.ancho_miniatura / float(frame.shape[1])
+            miniatura = cv2.resize(frame, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+            _, datos = cv2.imencode(".jpg", miniatura, [cv2.IMWRITE_JPEG_QUALITY, self.calidad_miniatura])
+            self.miniaturas.append(datos.tobytes())
+
+    def cerrar(self):
+        with self._lock:
+            if self._escritor is not None:
+                self._escritor.release()
+                self._escritor = None
+
+    @property
+    def cerrado(self):
+        return self._escritor is None
+
+    def miniatura(self, idx):
+        return self.miniaturas[idx]
+
+    def frame(self, idx):
+        # Frame completo leído del archivo ya escrito (None mientras se graba)
+        if not self.cerrado or not os.path.exists(self.ruta):
+            return None
+        if self._almacen is None:
+            self._almacen = AlmacenFrames(self.ruta)
+        return self._almacen.frame(idx)
+
+    def datos(self):
+        with open(self.ruta, "rb") as f:
+            return f.read()
+
+    def descartar(self):
+        self.cerrar()
+        if self._almacen is not None:
+            self._almacen.cerrar()
+            self._almacen = None
+        _borrar(self.ruta)
+
+
+def crear_video_sintetico(ruta, frames=300, tamano=(1280, 720), fps=30):
+    # Video de prueba: un cuadrado que cruza la escena sobre fondo con ruido
+    ancho, alto = tamano
+    escritor = cv2.VideoWriter(ruta, cv2.VideoWriter_fourcc(*"mp4v"), fps, tamano)
+    fondo = np.random.default_rng(0).integers(0, 60, (alto, ancho, 3), dtype=np.uint8)
+    for i in range(frames):
+        cuadro = fondo.copy()
+        x = (i * 7) % (ancho - 120)
+        cv2.rectangle(cuadro, (x, alto // 3), (x + 120, alto // 3 + 120), (255, 255, 255), -1)
+        escritor.write(cuadro)
+    escritor.release()
+    return ruta
+
+
+def _trabajo_movimiento(previo, gris):
+    diferencia = cv2.absdiff(previo, gris)
+    _, binario = cv2.threshold(diferencia, 25, 255, cv2.THRESH_BINARY)
+    binario = cv2.dilate(binario, np.ones((7, 7), np.uint8))
+    cv2.findContours(binario, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+
+def medir_lectura(ruta, tamano=(640, 480), paso=1):
+    # Frames/s del bucle síncrono (read + resize + gris + trabajo en el mismo
+    # hilo) contra el LectorFrames en segundo plano con el mismo trabajo
+    resultados = {}
+
+    inicio = time.perf_counter()
+    captura = cv2.VideoCapture(ruta)
+    previo, cantidad = None, 0
+    while True:
+        ok, frame = captura.read()
+        if not ok:
+            break
+        for _ in range(paso - 1):
+            captura.grab()
+        frame = cv2.resize(frame, tamano)
+        gris = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if previo is not None:
+            _trabajo_movimiento(previo, gris)
+        previo, cantidad = gris, cantidad + 1
+    captura.release()
+    resultados["sincrono"] = cantidad / (time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    previo, cantidad = None, 0
+    for _, frame, gris in LectorFrames(ruta, paso=paso, tamano=tamano):
+        if previo is not None:
+            _trabajo_movimiento(previo, gris)
+        previo, cantidad = gris, cantidad + 1
+    resultados["hilo"] = cantidad / (time.perf_counter() - inicio)
+    return resultados
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description='Benchmark of synchronous vs threaded frame reading')
+    parser.add_argument("--input-video", dest="input_video", required=False,
+                        help="Video to read (a synthetic one is generated if omitted)")
+    parser.add_argument("--frames", dest="frames", type=int, default=300,
+                        help="Frames of the synthetic video")
+    parser.add_argument("--stride", dest="stride", type=int, default=1,
+                        help="Decode every n-th frame")
+    return parser
+
+
+if __name__ == '__main__':
+    args = build_arg_parser().parse_args()
+    ruta = args.input_video
+    if ruta is None:
+        ruta = crear_video_sintetico(os.path.join(tempfile.gettempdir(), "sintetico.mp4"), args.frames)
+    res = medir_lectura(ruta, paso=args.stride)
+    print("Synchronous: %.1f frames/s" % res["sincrono"])
+    print("Threaded:    %.1f frames/s" % res["hilo"])
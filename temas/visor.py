@@ -0,0 +1,54 @@
+import time
+
+import cv2
+import streamlit as st
+
+
+# Mostrar frames sin matplotlib: se codifican a JPEG con OpenCV y se
+# envían directo a un st.empty(). Mucho más barato que rasterizar una
+# figura a PNG por cada frame.
+def codificar_jpeg(imagen, calidad=85, ancho_max=None):
+    if ancho_max is not None and imagen.shape[1] > ancho_max:
+        factor = ancho_max / float(imagen.shape[1])
+        imagen = cv2.resize(imagen, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+    ok, datos = cv2.imencode(".jpg", imagen, [cv2.IMWRITE_JPEG_QUALITY, int(calidad)])
+    if not ok:
+        raise ValueError("No se pudo codificar la imagen")
+    return datos.tobytes()
+
+
+def mostrar_imagen(imagen, titulo=None, calidad=90, ancho_max=None, contenedor=None):
+    # Imagen BGR (o gris) suelta, para los temas que antes usaban plt.imshow
+    contenedor = st if contenedor is None else contenedor
+    contenedor.image(codificar_jpeg(imagen, calidad, ancho_max), caption=titulo)
+
+
+class VisorFrames(object):
+    # Actualiza un único hueco de imagen con un tope fijo de `fps_max`
+    # frames por segundo; los que llegan antes se descartan. st.image solo
+    # encola el mensaje y no espera al navegador, así que el tope es la
+    # política de descarte, no una medida de cuánto se atrasa el cliente.
+    def __init__(self, contenedor=None, calidad=80, ancho_max=None, fps_max=15):
+        self.contenedor = st.empty() if contenedor is None else contenedor
+        self.calidad = calidad
+        self.ancho_max = ancho_max
+        self.intervalo_min = 1.0 / fps_max if fps_max else 0.0
+        self.ultimo = None
+        self.mostrados = 0
+        self.descartados = 0
+
+    def listo(self):
+        if self.ultimo is None:
+            return True
+        return time.perf_counter() - self.ultimo >= self.intervalo_min
+
+    def mostrar(self, frame, titulo=None, forzar=False):
+        # Devuelve True si el frame se mostró y False si se descartó
+        if not forzar and not self.listo():
+            self.descartados += 1
+            return False
+
+        self.contenedor.image(codificar_jpeg(frame, self.calidad, self.ancho_max), caption=titulo)
+        self.ultimo = time.perf_counter()
+        self.mostrados += 1
+        return True
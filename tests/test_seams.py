@@ -0,0 +1,71 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from temas.seams import acumular_energia, buscar_seam_vertical
+
+
+def seam_referencia(energia):
+    # Doble bucle original de tema6, conservado como referencia
+    filas, columnas = energia.shape[:2]
+    seam = np.zeros(filas)
+    distancia = np.zeros((filas, columnas)) + float("inf")
+    distancia[0, :] = np.zeros(columnas)
+    camino = np.zeros((filas, columnas))
+
+    for f in range(filas - 1):
+        for c in range(columnas):
+            if c != 0 and distancia[f+1, c-1] > distancia[f, c] + energia[f+1, c-1]:
+                distancia[f+1, c-1] = distancia[f, c] + energia[f+1, c-1]
+                camino[f+1, c-1] = 1
+            if distancia[f+1, c] > distancia[f, c] + energia[f+1, c]:
+                distancia[f+1, c] = distancia[f, c] + energia[f+1, c]
+                camino[f+1, c] = 0
+            if c != columnas-1 and distancia[f+1, c+1] > distancia[f, c] + energia[f+1, c+1]:
+                distancia[f+1, c+1] = distancia[f, c] + energia[f+1, c+1]
+                camino[f+1, c+1] = -1
+
+    seam[filas-1] = np.argmin(distancia[filas-1, :])
+    for i in range(filas-1, 0, -1):
+        seam[i-1] = seam[i] + camino[i, int(seam[i])]
+    return seam, distancia[filas-1]
+
+
+def energias_fijas():
+    rng = np.random.default_rng(1234)
+    return [
+        # Sin textura: todo son empates
+        np.zeros((12, 9)),
+        np.ones((7, 7), dtype=np.uint8),
+        # Pocos valores distintos, muchos empates
+        rng.integers(0, 3, size=(20, 15)).astype(np.float64),
+        rng.integers(0, 2, size=(31, 4), dtype=np.uint8),
+        # Columna y fila sueltas
+        rng.random((25, 1)),
+        rng.random((1, 10)),
+        # Valores continuos y una diagonal barata
+        rng.random((40, 33)) * 255,
+        np.where(np.eye(16, 16, dtype=bool), 0.0, 10.0),
+        np.arange(60, dtype=np.float64).reshape(6, 10) % 4,
+    ]
+
+
+@pytest.mark.parametrize("energia", energias_fijas())
+def test_seam_igual_al_doble_bucle(energia):
+    esperado, costo_esperado = seam_referencia(energia)
+    costo, _ = acumular_energia(energia)
+
+    np.testing.assert_array_equal(buscar_seam_vertical(energia), esperado.astype(np.intp))
+    np.testing.assert_allclose(costo, costo_esperado)
+
+
+def test_seam_igual_al_doble_bucle_aleatorio():
+    rng = np.random.default_rng(7)
+    for _ in range(50):
+        filas, columnas = rng.integers(1, 30, size=2)
+        energia = rng.integers(0, 4, size=(filas, columnas), dtype=np.uint8)
+        esperado, _ = seam_referencia(energia)
+        np.testing.assert_array_equal(buscar_seam_vertical(energia), esperado.astype(np.intp))